@@ -1,16 +1,36 @@
+import collections
 import queue
 import threading
 import time
 from typing import Callable, List, Optional
 
+import gestures
+import robot_log
+
+log = robot_log.get("ACTION")
+
 
 class ActionRunner:
-    def __init__(self, ctrl, on_state_change: Optional[Callable[[Optional[str]], None]] = None):
+    def __init__(
+        self,
+        ctrl,
+        on_state_change: Optional[Callable[[Optional[str]], None]] = None,
+        gesture_file: str = gestures.DEFAULT_GESTURE_FILE,
+        on_interrupt: Optional[Callable[[], None]] = None,
+    ):
         self.ctrl = ctrl
         self.on_state_change = on_state_change
+        # Called on every interrupt(), e.g. to cut off speech (barge-in).
+        self.on_interrupt = on_interrupt
+        # Compiled once; _run_action is a dict lookup plus a replay of
+        # pre-encoded frames.
+        self.gestures = gestures.GestureLibrary(ctrl, gesture_file)
         self.q: "queue.Queue[List[str]]" = queue.Queue()
         self.lock = threading.Lock()
         self.cancel_event = threading.Event()
+        # Per-step timing of recent gestures: (action, step, scheduled_s,
+        # actual_s), offsets from the gesture's start on the monotonic clock.
+        self.step_timing: "collections.deque" = collections.deque(maxlen=2000)
         self.worker = threading.Thread(target=self._worker_loop, daemon=True)
         self.worker.start()
 
@@ -27,158 +47,110 @@ class ActionRunner:
                     self.q.get_nowait()
                 except queue.Empty:
                     break
+        if self.on_interrupt:
+            try:
+                self.on_interrupt()
+            except Exception as ex:
+                log.error("interrupt hook failed: %s", ex)
         try:
             self.ctrl.stop()
         except Exception as ex:
-            print(f"[ACTION] stop failed during interrupt: {ex}")
+            log.error("stop failed during interrupt: %s", ex)
 
     def _set_state(self, value: Optional[str]) -> None:
         if self.on_state_change:
             self.on_state_change(value)
 
-    def _sleep_with_cancel(self, seconds: float, deadline: float) -> bool:
-        end = time.time() + seconds
-        while time.time() < end:
-            if self.cancel_event.is_set() or time.time() > deadline:
-                return False
-            time.sleep(0.03)
-        return True
-
-    def _run_action(self, action: str) -> None:
-        caps = {
-            "head_yes": 3.0,
-            "head_no": 3.0,
-            "arm_raise": 4.0,
-            "dance90": 6.0,
+    def timing_stats(self) -> dict:
+        """
+        Lateness of recent gesture steps (actual - scheduled start), in ms.
+        """
+        late = sorted((actual - scheduled) * 1000.0 for _, _, scheduled, actual in list(self.step_timing))
+        if not late:
+            return {"steps": 0, "mean_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        return {
+            "steps": len(late),
+            "mean_ms": round(sum(late) / len(late), 3),
+            "p99_ms": round(late[min(len(late) - 1, int(0.99 * len(late)))], 3),
+            "max_ms": round(late[-1], 3),
         }
-        cap = caps.get(action)
-        if cap is None:
-            print(f"[ACTION] warning: unknown action <{action}> ignored")
-            return
 
-        deadline = time.time() + cap
-        print(f"[ACTION] start <{action}> cap={cap:.1f}s")
+    def _wait_settled(self, max_s: float, deadline: float, channels) -> bool:
+        # Return-to-neutral settle: done as soon as the gesture's own servos
+        # are at target (other gestures may still be moving theirs).
+        # Each poll's reply is bounded, so a stalled port can't hold the
+        # worker past the deadline or an interrupt().
+        timeout = min(max_s, deadline - time.monotonic())
+        if timeout <= 0:
+            return False
+        return self.ctrl.maestro.waitUntilSettled(
+            timeout=timeout, cancelEvent=self.cancel_event, channels=channels
+        )
+
+    def _run_action(self, action: str, gesture: "gestures.Gesture") -> None:
+        deadline = time.monotonic() + gesture.cap
+        log.info("start <%s> cap=%.1fs groups=%s", action, gesture.cap, sorted(gesture.groups))
         self._set_state("EXEC_ACTIONS")
 
-        if action == "head_yes":
-            base = self.ctrl.robot.servo_neutral("head_tilt")
-            self.ctrl.head_tilt(min(8000, base + 900))
-            if not self._sleep_with_cancel(0.4, deadline):
-                return
-            self.ctrl.head_tilt(max(2000, base - 900))
-            if not self._sleep_with_cancel(0.4, deadline):
-                return
-            self.ctrl.head_tilt(base)
-            self._sleep_with_cancel(0.2, deadline)
-            return
-
-        if action == "head_no":
-            base = self.ctrl.robot.servo_neutral("head_pan")
-            self.ctrl.head_pan(min(8000, base + 1400))
-            if not self._sleep_with_cancel(0.35, deadline):
-                return
-            self.ctrl.head_pan(max(2000, base - 1400))
-            if not self._sleep_with_cancel(0.45, deadline):
+        done = False
+        trace = []
+        try:
+            done = gesture.play(self.cancel_event, deadline, trace=trace)
+        finally:
+            self.step_timing.extend((action, i, scheduled, actual) for i, (scheduled, actual) in enumerate(trace))
+            if trace:
+                worst = max(actual - scheduled for scheduled, actual in trace)
+                log.info("<%s> %d steps, max late %.2fms", action, len(trace), worst * 1000.0)
+            # Wheel deadman: gestures that drive always stop on the way out.
+            if gesture.stop_on_exit:
+                self.ctrl.stop()
+            if not done and gesture.neutral_pose:
+                self.ctrl.set_pose(gesture.neutral_pose)
+        if done and gesture.settle > 0 and gesture.channels:
+            self._wait_settled(gesture.settle, deadline, gesture.channels)
+
+    def _run_after(self, action: str, gesture: "gestures.Gesture", waits, finished: threading.Event) -> None:
+        try:
+            for other in waits:
+                other.wait()
+            if self.cancel_event.is_set():
                 return
-            self.ctrl.head_pan(base)
-            self._sleep_with_cancel(0.2, deadline)
-            return
-
-        # if action == "arm_raise":
-        #     self.ctrl.arm_raise_sequence(deadline=deadline, cancel_event=self.cancel_event)
-        #     return
-
-        if action == "arm_raise":
+            self._run_action(action, gesture)
+        except Exception as ex:
+            log.error("error in <%s>: %s", action, ex)
             try:
-                self.ctrl.right_shoulder_ud(7000)
-                self.ctrl.right_elbow_ud(7000)
-                if not self._sleep_with_cancel(0.5, deadline):
-                    return
-            finally:
-                self.ctrl.right_shoulder_ud(self.ctrl.robot.servo_neutral("right_shoulder_ud"))
-                self.ctrl.right_elbow_ud(self.ctrl.robot.servo_neutral("right_elbow_ud"))
-            self._sleep_with_cancel(0.2, deadline)
-            return
-
-        # if action == "dance90":
-        #     # Wheel deadman safety: always stop wheels on exit.
-        #     try:
-        #         # Add waist dance motion during rotation.
-        #         self.ctrl.waist(2000)
-        #         if not self._sleep_with_cancel(0.2, deadline):
-        #             return
-        #         self.ctrl.turn_left(1000)
-        #         if not self._sleep_with_cancel(0.6, deadline):
-        #             return
-        #         self.ctrl.stop()
-        #         if not self._sleep_with_cancel(0.15, deadline):
-        #             return
-        #         self.ctrl.waist(8000)
-        #         if not self._sleep_with_cancel(0.2, deadline):
-        #             return
-        #         self.ctrl.turn_right(1100)
-        #         if not self._sleep_with_cancel(0.6, deadline):
-        #             return
-        #         self.ctrl.waist(self.ctrl.robot.servo_neutral("waist"))
-        #         if not self._sleep_with_cancel(0.15, deadline):
-        #             return
-        #     finally:
-        #         self.ctrl.stop()
-        #         self.ctrl.waist(self.ctrl.robot.servo_neutral("waist"))
-
-        if action == "dance90":
-
-                    WAIST_CENTER = 5000
-                    WAIST_LEFT   = 6500
-                    WAIST_RIGHT  = 3500
-                    try:
-                # ---- LEFT SIDE ----
-                        self.ctrl.turn_left(1000)
-                        if not self._sleep_with_cancel(0.35, deadline):
-                            return
-                        self.ctrl.waist(WAIST_LEFT)
-                        if not self._sleep_with_cancel(0.35, deadline):
-                            return
-                        self.ctrl.stop()
-                        if not self._sleep_with_cancel(0.15, deadline):
-                            return
-
-                # ---- RIGHT SIDE ----
-                        self.ctrl.turn_right(1000)
-                        if not self._sleep_with_cancel(0.35, deadline):
-                            return
-                        self.ctrl.waist(WAIST_RIGHT)
-                        if not self._sleep_with_cancel(0.35, deadline):
-                            return
-                        self.ctrl.stop()
-                        if not self._sleep_with_cancel(0.15, deadline):
-                            return
-
-                # ---- CENTER ----
-                        self.ctrl.waist(WAIST_CENTER)
-                        if not self._sleep_with_cancel(0.3, deadline):
-                            return
-                            # counter the last right turn
-                        self.ctrl.turn_left(1000)
-                        if not self._sleep_with_cancel(0.35, deadline):
-                            return
-                    finally:
-                        self.ctrl.stop()
+                self.ctrl.stop()
+            except Exception:
+                pass
+        finally:
+            finished.set()
+
+    def _run_batch(self, actions: List[str]) -> None:
+        # Each action starts once every earlier action in the batch that
+        # shares a joint group has finished, so conflicting actions keep
+        # their order and the rest run concurrently.
+        started = []
+        threads = []
+        for action in actions:
+            gesture = self.gestures.get(action)
+            if gesture is None:
+                log.warning("unknown action <%s> ignored", action)
+                continue
+            waits = [finished for groups, finished in started if groups & gesture.groups]
+            finished = threading.Event()
+            started.append((gesture.groups, finished))
+            thread = threading.Thread(
+                target=self._run_after, args=(action, gesture, waits, finished), daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
 
     def _worker_loop(self) -> None:
         while True:
             actions = self.q.get()
             self.cancel_event.clear()
-            for action in actions:
-                if self.cancel_event.is_set():
-                    break
-                try:
-                    self._run_action(action)
-                except Exception as ex:
-                    print(f"[ACTION] error in <{action}>: {ex}")
-                    try:
-                        self.ctrl.stop()
-                    except Exception:
-                        pass
+            self._run_batch(actions)
             # Clear override so state falls back to dialog engine state.
             self._set_state(None)
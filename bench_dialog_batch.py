@@ -0,0 +1,39 @@
+import os
+import random
+import sys
+import time
+
+from dialog_engine import DialogEngine
+
+# Throughput of DialogEngine.run_batch, sequential and on a process pool.
+SCRIPT = os.path.join(os.path.dirname(__file__), "testDialogFileForPractice.txt")
+UTTERANCES = [
+    "hello", "yes", "no", "hi there", "you are awesome", "my name is alex",
+    "i am 20 years old", "who am i", "how old am i", "dance", "wave at me",
+    "thanks", "goodbye", "what is the weather", "",
+]
+SESSIONS = 64
+PER_SESSION = 500
+
+
+if __name__ == "__main__":
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    rng = random.Random(0)
+    inputs = []
+    sessions = []
+    for s in range(SESSIONS):
+        for _ in range(PER_SESSION):
+            inputs.append(rng.choice(UTTERANCES))
+            sessions.append(f"s{s}")
+
+    eng = DialogEngine.from_file(SCRIPT, seed=0)
+    runs = [("sequential", None), (f"pool x{processes}", processes)]
+    for label, procs in runs:
+        t0 = time.perf_counter()
+        results = eng.run_batch(inputs, sessions=sessions, processes=procs)
+        elapsed = time.perf_counter() - t0
+        matched = sum(1 for r in results if r["matched"])
+        print(
+            f"{label:>12}: {len(inputs)} utterances in {elapsed:.2f}s "
+            f"-> {len(inputs) / elapsed:,.0f} utt/s ({matched} matched)"
+        )
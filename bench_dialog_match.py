@@ -0,0 +1,72 @@
+import os
+import tempfile
+import time
+
+from dialog_engine import DialogEngine, RuleMatcher, normalize_text
+
+# Compares the linear per-rule scan, RuleMatcher (one combined regex per
+# rule list) and RuleIndex (first-word prefilter + RuleMatcher, what
+# handle_input uses) on generated scripts.
+SIZES = [10, 100, 1000]
+ROUNDS = 2000
+
+
+def write_script(path, n_rules):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("~greet: [hello hi howdy \"hi there\"]\n")
+        for i in range(n_rules):
+            kind = i % 3
+            if kind == 0:
+                f.write(f"u:(topic{i} please): answer {i}\n")
+            elif kind == 1:
+                f.write(f"u:(~greet robot{i}): hi from {i}\n")
+            else:
+                f.write(f"u:(my item{i} is _): noted $item{i}\n")
+
+
+def make_inputs(n_rules):
+    mid = n_rules // 2
+    mid -= (mid - 1) % 3        # nearest ~greet rule
+    last = n_rules - 1
+    last -= (last - 2) % 3      # last capture rule
+    return [
+        "topic0 please",                # first rule
+        f"hi there robot{mid}",         # middle
+        f"my item{last} is blue",       # near the end
+        "nothing matches this input",   # full miss
+    ]
+
+
+def bench(fn, inputs):
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        for text in inputs:
+            fn(text)
+    return (time.perf_counter() - t0) / (ROUNDS * len(inputs))
+
+
+if __name__ == "__main__":
+    tmp_dir = tempfile.mkdtemp()
+    print(f"{'rules':>6} {'linear us':>10} {'combined us':>12} {'indexed us':>11} {'speedup':>8}")
+    for n in SIZES:
+        path = os.path.join(tmp_dir, f"rules_{n}.txt")
+        write_script(path, n)
+        eng = DialogEngine.from_file(path, seed=0)
+        inputs = [normalize_text(x) for x in make_inputs(n)]
+        matcher = RuleMatcher(eng.top_rules)
+
+        # All paths must agree before timing means anything.
+        for text in inputs:
+            a = eng._scan_rules(eng.top_rules, text)
+            for b in (matcher.match(text), eng._find_match(eng.top_index, text)):
+                assert (a and (a[0].line, a[1])) == (b and (b[0].line, b[1])), text
+
+        linear = bench(lambda t: eng._scan_rules(eng.top_rules, t), inputs)
+        combined = bench(matcher.match, inputs)
+        indexed = bench(lambda t: eng._find_match(eng.top_index, t), inputs)
+        print(
+            f"{n:>6} {linear * 1e6:>10.2f} {combined * 1e6:>12.2f} "
+            f"{indexed * 1e6:>11.2f} {linear / indexed:>7.1f}x"
+        )
+        os.remove(path)
+    os.rmdir(tmp_dir)
@@ -0,0 +1,74 @@
+import contextlib
+import os
+import time
+import tracemalloc
+
+from bench_maestro_cmds import FakeSerial
+from gestures import GestureLibrary
+import robot_log
+from robot_control import RobotControl
+
+# Cost of triggering a gesture once, without the waits: the pre-encoded
+# frames GestureLibrary replays versus clamping and encoding a target dict
+# per frame through Controller.setTargets.
+ROUNDS = 2000
+
+
+def replay(timeline):
+    for _, fn, args in timeline:
+        fn(*args)
+
+
+def as_target_dicts(ctrl, timeline):
+    # Same frames, but as dicts that setTargets must clamp and encode.
+    out = []
+    for t, fn, args in timeline:
+        if fn == ctrl.maestro.writeEncoded:
+            out.append((t, ctrl.maestro.setTargets, (dict(args[1]),)))
+        else:
+            out.append((t, fn, args))
+    return out
+
+
+def bench(timeline):
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        replay(timeline)
+    return (time.perf_counter() - t0) / ROUNDS
+
+
+def allocated(timeline):
+    replay(timeline)  # warm up
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    replay(timeline)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, "filename") if stat.size_diff > 0)
+
+
+if __name__ == "__main__":
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        ctrl = RobotControl(port="sim")
+        ctrl.maestro.usb = FakeSerial()
+        library = GestureLibrary(ctrl)
+        robot_log.flush()
+
+    print(f"{'gesture':>10} {'frames':>7} {'dicts us':>9} {'encoded us':>11} {'speedup':>8} {'alloc B':>8}")
+    for name in ("head_yes", "head_no", "arm_raise"):
+        timeline = library.get(name).timeline
+        legacy = as_target_dicts(ctrl, timeline)
+
+        # Both paths must put the same bytes on the wire.
+        for (_, fn, args), (_, _, legacy_args) in zip(timeline, legacy):
+            fn(*args)
+            encoded = ctrl.maestro.usb.last
+            ctrl.maestro.setTargets(*legacy_args)
+            assert encoded == ctrl.maestro.usb.last, name
+
+        before = bench(legacy)
+        after = bench(timeline)
+        print(
+            f"{name:>10} {len(timeline):>7} {before * 1e6:>9.1f} {after * 1e6:>11.1f} "
+            f"{before / after:>7.1f}x {allocated(timeline):>8}"
+        )
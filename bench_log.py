@@ -0,0 +1,47 @@
+import contextlib
+import io
+import logging
+import os
+import time
+
+import robot_log
+
+# Caller-side cost of one hot-path log line (Servo.move's "[SERVO] chN -> v"):
+# the old synchronous print() into a buffer standing in for stdout, against
+# robot_log with the level disabled, and enabled (queued plus rate limited).
+N = 200000
+
+
+def bench(fn):
+    t0 = time.perf_counter()
+    for i in range(N):
+        fn(i)
+    return (time.perf_counter() - t0) / N
+
+
+if __name__ == "__main__":
+    sink = io.StringIO()
+    log = robot_log.get("SERVO")
+
+    def old_print(i):
+        print(f"[SERVO] ch{i % 24} -> {4000 + i % 4000}", file=sink)
+
+    def new_log(i):
+        log.debug("ch%d -> %d", i % 24, 4000 + i % 4000)
+
+    results = [
+        ("loop only", bench(lambda i: (i % 24, 4000 + i % 4000))),
+        ("print", bench(old_print)),
+    ]
+    log.setLevel(logging.INFO)
+    results.append(("disabled", bench(new_log)))
+    log.setLevel(logging.DEBUG)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results.append(("rate limited", bench(new_log)))
+        robot_log.flush()
+    log.setLevel(logging.NOTSET)
+
+    print(f"{'path':>14} {'ns/line':>9}")
+    for name, seconds in results:
+        print(f"{name:>14} {seconds * 1e9:>9.0f}")
+    print(f"suppressed: {robot_log.stats()['suppressed']['SERVO']}")
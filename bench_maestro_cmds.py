@@ -0,0 +1,62 @@
+import time
+
+from maestro import Controller
+
+# Commands per second through Controller.setTarget against a fake serial
+# port, compared with the old chr()-string + latin-1 encode path.
+N = 200000
+
+
+class FakeSerial:
+    def __init__(self):
+        self.bytes_written = 0
+        self.last = b""
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        self.last = data
+        return len(data)
+
+    def read(self, size=1):
+        return b"\x00" * size
+
+    def close(self):
+        pass
+
+
+def legacy_set_target(ctrl, chan, target):
+    # The encoder setTarget used before the bytes/struct rewrite.
+    if ctrl.Mins[chan] > 0 and target < ctrl.Mins[chan]:
+        target = ctrl.Mins[chan]
+    if ctrl.Maxs[chan] > 0 and target > ctrl.Maxs[chan]:
+        target = ctrl.Maxs[chan]
+    lsb = target & 0x7f
+    msb = (target >> 7) & 0x7f
+    cmd = chr(0x04) + chr(chan) + chr(lsb) + chr(msb)
+    ctrl.usb.write(bytes(ctrl.PololuCmd + cmd, "latin-1"))
+    ctrl.Targets[chan] = target
+
+
+def bench(fn, ctrl):
+    t0 = time.perf_counter()
+    for i in range(N):
+        fn(ctrl, i % 17, 4000 + (i % 4000))
+    return N / (time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    ctrl = Controller(usb=FakeSerial())
+    for ch in range(17):
+        ctrl.setRange(ch, 2000, 8000)
+
+    # Same bytes on the wire from both encoders.
+    for target in (2000, 5000, 6000, 8000):
+        legacy_set_target(ctrl, 5, target)
+        legacy = ctrl.usb.last
+        ctrl.setTarget(5, target)
+        assert legacy == ctrl.usb.last, (legacy, ctrl.usb.last)
+
+    before = bench(legacy_set_target, ctrl)
+    after = bench(Controller.setTarget, ctrl)
+    print(f"legacy chr()/latin-1 setTarget: {before:,.0f} cmds/s")
+    print(f"struct-packed setTarget:        {after:,.0f} cmds/s ({after / before:.2f}x)")
@@ -0,0 +1,84 @@
+import contextlib
+import os
+import sys
+import threading
+import time
+
+# Request-rate benchmark for the whole Flask stack on the simulated Maestro.
+# Runs in-process through Flask's test client; no hardware or network needed.
+os.environ.setdefault("MAESTRO_PORT", "sim")
+
+CLIENTS = 8
+REQUESTS_PER_CLIENT = 500
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+
+def run_client(app, idx, route, make_body, latencies):
+    client = app.test_client()
+    for i in range(REQUESTS_PER_CLIENT):
+        t0 = time.perf_counter()
+        res = client.post(route, json=make_body(idx, i))
+        latencies.append(time.perf_counter() - t0)
+        assert res.status_code == 200, res.get_json()
+
+
+def bench(app, label, route, make_body):
+    latencies = []
+    threads = [
+        threading.Thread(target=run_client, args=(app, c, route, make_body, latencies))
+        for c in range(CLIENTS)
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    print(
+        f"{label:>18}: {len(latencies) / elapsed:8,.0f} req/s  "
+        f"p50 {percentile(latencies, 50) * 1e3:6.2f} ms  "
+        f"p99 {percentile(latencies, 99) * 1e3:6.2f} ms",
+        file=sys.stderr,
+    )
+
+
+def bench_frames(handle, label, make_frame):
+    # Control-channel frames skip HTTP entirely; time the handler alone.
+    latencies = []
+    n = CLIENTS * REQUESTS_PER_CLIENT
+    t0 = time.perf_counter()
+    for i in range(n):
+        t1 = time.perf_counter()
+        reply = handle(make_frame(i))
+        latencies.append(time.perf_counter() - t1)
+        assert reply is None, reply
+    elapsed = time.perf_counter() - t0
+    print(
+        f"{label:>18}: {n / elapsed:8,.0f} req/s  "
+        f"p50 {percentile(latencies, 50) * 1e3:6.3f} ms  "
+        f"p99 {percentile(latencies, 99) * 1e3:6.3f} ms",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    # The server prints on every command; keep that out of the results.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import flaskServer
+
+        app = flaskServer.app
+        bench(app, "/api/drive", "/api/drive",
+              lambda c, i: {"left": 800 + i % 800, "right": 800})
+        bench_frames(flaskServer.handle_control_frame, "ws drive frame",
+                     lambda i: f"d {800 + i % 800} 800")
+        bench(app, "/api/head_pan", "/api/head_pan",
+              lambda c, i: {"value": 3000 + (i * 37) % 4000})
+        bench(app, "/api/dialog_input", "/api/dialog_input",
+              lambda c, i: {"text": ["hello", "yes", "my name is sam", "who am i"][i % 4],
+                            "session": f"bench-{c}"})
+        flaskServer.ctrl.stop()
+        flaskServer.robot_log.flush()
@@ -1,8 +1,20 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
 import random
 import re
+import sys
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
 
+import robot_log
+
+log = robot_log.get("DIALOG")
 
 PUNCT_RE = re.compile(r"[.,!?]")
 SPACE_RE = re.compile(r"\s+")
@@ -12,7 +24,11 @@ ASSIGN_RE = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)\s*=\s*\$(\d+)")
 ACTION_RE = re.compile(r"<([A-Za-z_][A-Za-z0-9_]*)>")
 RULE_RE = re.compile(r"^\s*u(\d*)\s*:\s*\((.*?)\)\s*:\s*(.+?)\s*$")
 DEF_RE = re.compile(r"^\s*~([A-Za-z_][A-Za-z0-9_]*)\s*:\s*(.+?)\s*$")
+DEF_REF_RE = re.compile(r"~([A-Za-z_][A-Za-z0-9_]*)")
+CHOICE_RE = re.compile(r"\[([^\[\]]+)\]")
 INTERRUPT_WORDS = {"stop", "cancel", "reset", "quit"}
+STOP_REPLY = "Stopping now."
+UNKNOWN_REPLY = "I don't know"
 
 
 @dataclass
@@ -36,6 +52,72 @@ class Rule:
     line: int
     children: List["Rule"] = field(default_factory=list)
     order: int = 0
+    regex: Optional[re.Pattern] = None
+    capture_slots: List[int] = field(default_factory=list)
+    leading_words: Optional[FrozenSet[str]] = None
+    child_index: Optional["RuleIndex"] = None
+
+
+class RuleMatcher:
+    """
+    One alternation regex over an ordered rule list.
+    Python tries alternatives left to right, so the first rule (by order)
+    that matches the whole input wins, same as scanning the list.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = [r for r in sorted(rules, key=lambda r: r.order) if r.regex is not None]
+        # Strip each rule's ^...$ anchors and tag the branch with an empty
+        # group at its end, so the branch still starts with its own literal
+        # and the regex engine can skip it on the first character.
+        # Input and patterns are both normalized to lower case already.
+        parts = [
+            f"{rule.regex.pattern[1:-1]}(?P<r{i}>)"
+            for i, rule in enumerate(self.rules)
+        ]
+        self.regex = re.compile("^(?:" + "|".join(parts) + ")$") if parts else None
+
+    def match(self, normalized_input: str) -> Optional[Tuple[Rule, List[str]]]:
+        if self.regex is None:
+            return None
+        m = self.regex.match(normalized_input)
+        if m is None:
+            return None
+        # The empty tag group closes last; the rule's captures sit just before it.
+        idx = m.lastindex
+        rule = self.rules[int(m.lastgroup[1:])]
+        captures = list(m.groups()[idx - 1 - len(rule.capture_slots) : idx - 1])
+        return (rule, captures)
+
+
+class RuleIndex:
+    """
+    First-word prefilter in front of RuleMatcher.
+    Patterns are anchored at the start, so a rule can only match inputs whose
+    first word is one of its leading_words. Rules that start with _ (or whose
+    first token could not be resolved) go in a fallback bucket that is merged
+    into every word's matcher, keeping Rule.order across both.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        fallback: List[Rule] = []
+        buckets: Dict[str, List[Rule]] = {}
+        for rule in rules:
+            if rule.regex is None:
+                continue
+            if rule.leading_words is None:
+                fallback.append(rule)
+                continue
+            for word in rule.leading_words:
+                buckets.setdefault(word, []).append(rule)
+        self.by_word: Dict[str, RuleMatcher] = {
+            word: RuleMatcher(bucket + fallback) for word, bucket in buckets.items()
+        }
+        self.fallback = RuleMatcher(fallback)
+
+    def match(self, normalized_input: str) -> Optional[Tuple[Rule, List[str]]]:
+        first = normalized_input.split(" ", 1)[0]
+        return self.by_word.get(first, self.fallback).match(normalized_input)
 
 
 def _strip_comments(line: str) -> str:
@@ -95,193 +177,252 @@ def _find_matching_bracket(text: str, start: int) -> int:
     return -1
 
 
-class DialogEngine:
-    def __init__(self, filename: str, seed: Optional[int] = None):
+# abspath -> ((mtime_ns, size), sha1, DialogScript); see DialogScript.load().
+_SCRIPT_CACHE: Dict[str, Tuple[Tuple[int, int], str, "DialogScript"]] = {}
+_SCRIPT_CACHE_LOCK = threading.Lock()
+
+
+class DialogScript:
+    """
+    Parsed and compiled dialog script: rules, definitions, matchers and
+    parse errors. Nothing here changes after from_file(), so one instance
+    is shared by every conversation (DialogEngine) running it.
+    """
+
+    def __init__(self, filename: str):
         self.filename = filename
-        self.seed = seed
-        self.rng = random.Random(seed)
         self.definitions: Dict[str, List[str]] = {}
         self.top_rules: List[Rule] = []
+        self.top_index: Optional[RuleIndex] = None
         self.errors: List[ParseError] = []
-        self.variables: Dict[str, str] = {}
-        self.scope_stack: List[Rule] = []
-        self.unmatched_in_scope = 0
-        self.max_depth = 6  # depth counting top-level u as depth 1
-        self.state = "BOOT"
 
     @classmethod
-    def from_file(cls, filename: str, seed: Optional[int] = None) -> "DialogEngine":
-        eng = cls(filename=filename, seed=seed)
-        eng._parse_file()
-        if eng.has_fatal_errors():
-            eng.state = "BOOT"
+    def from_file(cls, filename: str) -> "DialogScript":
+        with open(filename, "r", encoding="utf-8") as f:
+            return cls.from_text(filename, f.read())
+
+    @classmethod
+    def from_text(cls, filename: str, text: str) -> "DialogScript":
+        script = cls(filename=filename)
+        script._parse_lines(text.splitlines())
+        script.top_index = script._compile_rules(script.top_rules)
+        return script
+
+    @classmethod
+    def load(cls, filename: str) -> "DialogScript":
+        """
+        from_file() with a cache keyed on the file's mtime/size and content
+        hash: an unchanged file returns the already-compiled script, and a
+        touched-but-identical file only costs a read and a hash.
+        """
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with _SCRIPT_CACHE_LOCK:
+            cached = _SCRIPT_CACHE.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[2]
+
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        if cached is not None and cached[1] == digest:
+            script = cached[2]
         else:
-            eng.state = "IDLE"
-        return eng
+            script = cls.from_text(filename, data.decode("utf-8"))
+        with _SCRIPT_CACHE_LOCK:
+            _SCRIPT_CACHE[path] = (stamp, digest, script)
+        return script
 
     def has_fatal_errors(self) -> bool:
         return any(e.fatal for e in self.errors)
 
-    def reset_to_idle(self, reason: str = "") -> None:
-        if reason:
-            print(f"[DIALOG] reset to IDLE: {reason}")
-        self.scope_stack = []
-        self.unmatched_in_scope = 0
-        self.state = "IDLE"
-
-    def interrupt_now(self) -> None:
-        self.reset_to_idle(reason="global interrupt")
-
-    def current_scope_depth(self) -> int:
-        return len(self.scope_stack)
-
-    def _set_scope_state(self) -> None:
-        if self.scope_stack:
-            self.state = f"IN_SCOPE({len(self.scope_stack)})"
-        else:
-            self.state = "IDLE"
+    def static_outputs(self, limit_per_rule: int = 32) -> List[str]:
+        """
+        Every spoken reply the script can produce without a variable or
+        capture in it, with [choices] and ~definitions expanded (at most
+        limit_per_rule variants per rule). Used to pre-render speech.
+        """
+        out: Dict[str, None] = {STOP_REPLY: None, UNKNOWN_REPLY: None}
+        stack = list(self.top_rules)
+        while stack:
+            rule = stack.pop()
+            stack.extend(rule.children)
+            text = ASSIGN_RE.sub("", rule.output)
+            if VAR_RE.search(text) or POS_VAR_RE.search(text):
+                continue
+            for variant in self._expand_output(text, limit_per_rule):
+                spoken = SPACE_RE.sub(" ", ACTION_RE.sub(" ", variant)).strip()
+                if spoken:
+                    out[spoken] = None
+        return list(out)
+
+    def _expand_output(self, text: str, limit: int) -> List[str]:
+        # Renderings DialogEngine._render_output could pick, breadth-first, up
+        # to limit. Every pending string yields at least one rendering, so
+        # pending is never grown past what limit still has room for; nested
+        # choices don't build their whole product first.
+        pending, done = deque([text]), []
+        while pending and len(done) < limit:
+            cur = pending.popleft()
+            room = limit - len(done) - len(pending)
+            match = CHOICE_RE.search(cur)
+            if match:
+                try:
+                    items = parse_choice_items(match.group(1))
+                except ValueError:
+                    items = []
+                for item in (items or [""])[:room]:
+                    pending.append(cur[: match.start()] + item + cur[match.end() :])
+                continue
+            match = DEF_REF_RE.search(cur)
+            if match:
+                for item in (self.definitions.get(match.group(1)) or [""])[:room]:
+                    pending.append(cur[: match.start()] + item + cur[match.end() :])
+                continue
+            done.append(SPACE_RE.sub(" ", cur).strip())
+        return done
 
-    def _parse_file(self) -> None:
+    def _parse_lines(self, lines: List[str]) -> None:
         last_by_level: Dict[int, Rule] = {}
         order = 0
-        with open(self.filename, "r", encoding="utf-8") as f:
-            for line_no, raw in enumerate(f, start=1):
-                line = _strip_comments(raw).strip()
-                if not line:
-                    continue
-
-                def_match = DEF_RE.match(line)
-                if def_match:
-                    name = def_match.group(1)
-                    rhs = def_match.group(2).strip()
-                    if not (rhs.startswith("[") and rhs.endswith("]")):
-                        self.errors.append(
-                            ParseError(
-                                self.filename,
-                                line_no,
-                                "definition",
-                                "definition must use [ ... ] list",
-                                fatal=False,
-                            )
-                        )
-                        continue
-                    try:
-                        items = parse_choice_items(rhs[1:-1])
-                    except ValueError as ex:
-                        self.errors.append(
-                            ParseError(
-                                self.filename,
-                                line_no,
-                                "definition",
-                                str(ex),
-                                fatal=False,
-                            )
-                        )
-                        continue
-                    if not items:
-                        self.errors.append(
-                            ParseError(
-                                self.filename,
-                                line_no,
-                                "definition",
-                                "empty definition list",
-                                fatal=False,
-                            )
-                        )
-                        continue
-                    self.definitions[name] = items
-                    continue
+        for line_no, raw in enumerate(lines, start=1):
+            line = _strip_comments(raw).strip()
+            if not line:
+                continue
 
-                rule_match = RULE_RE.match(line)
-                if not rule_match:
-                    # More specific message for common malformed rule:
-                    # u:(pattern) output   (missing second colon before output)
-                    if re.match(r"^\s*u\d*\s*:\s*\(.*\)\s*[^:].*$", line):
-                        self.errors.append(
-                            ParseError(
-                                self.filename,
-                                line_no,
-                                "delimiter",
-                                "missing second colon delimiter: expected u:(pattern):output",
-                                fatal=False,
-                            )
-                        )
-                        continue
+            def_match = DEF_RE.match(line)
+            if def_match:
+                name = def_match.group(1)
+                rhs = def_match.group(2).strip()
+                if not (rhs.startswith("[") and rhs.endswith("]")):
                     self.errors.append(
                         ParseError(
                             self.filename,
                             line_no,
-                            "syntax",
-                            "line is not a valid definition or rule",
+                            "definition",
+                            "definition must use [ ... ] list",
                             fatal=False,
                         )
                     )
                     continue
-
-                level = int(rule_match.group(1) or "0")
-                pattern = rule_match.group(2).strip()
-                output = rule_match.group(3).strip()
-
-                if level > 7:
+                try:
+                    items = parse_choice_items(rhs[1:-1])
+                except ValueError as ex:
                     self.errors.append(
                         ParseError(
                             self.filename,
                             line_no,
-                            "nesting",
-                            "rule level too deep to be usable",
+                            "definition",
+                            str(ex),
                             fatal=False,
                         )
                     )
                     continue
-
-                if pattern.count("[") != pattern.count("]"):
+                if not items:
                     self.errors.append(
                         ParseError(
                             self.filename,
                             line_no,
-                            "pattern",
-                            "unbalanced [] in pattern",
+                            "definition",
+                            "empty definition list",
                             fatal=False,
                         )
                     )
                     continue
+                self.definitions[name] = items
+                continue
 
-                if output.count("[") != output.count("]"):
+            rule_match = RULE_RE.match(line)
+            if not rule_match:
+                # More specific message for common malformed rule:
+                # u:(pattern) output   (missing second colon before output)
+                if re.match(r"^\s*u\d*\s*:\s*\(.*\)\s*[^:].*$", line):
                     self.errors.append(
                         ParseError(
                             self.filename,
                             line_no,
-                            "output",
-                            "unbalanced [] in output",
+                            "delimiter",
+                            "missing second colon delimiter: expected u:(pattern):output",
                             fatal=False,
                         )
                     )
                     continue
+                self.errors.append(
+                    ParseError(
+                        self.filename,
+                        line_no,
+                        "syntax",
+                        "line is not a valid definition or rule",
+                        fatal=False,
+                    )
+                )
+                continue
 
-                rule = Rule(level=level, pattern=pattern, output=output, line=line_no, order=order)
-                order += 1
+            level = int(rule_match.group(1) or "0")
+            pattern = rule_match.group(2).strip()
+            output = rule_match.group(3).strip()
 
-                if level == 0:
-                    self.top_rules.append(rule)
-                else:
-                    parent = last_by_level.get(level - 1)
-                    if parent is None:
-                        self.errors.append(
-                            ParseError(
-                                self.filename,
-                                line_no,
-                                "nesting",
-                                f"u{level} has no active parent u{level-1}",
-                                fatal=False,
-                            )
+            if level > 7:
+                self.errors.append(
+                    ParseError(
+                        self.filename,
+                        line_no,
+                        "nesting",
+                        "rule level too deep to be usable",
+                        fatal=False,
+                    )
+                )
+                continue
+
+            if pattern.count("[") != pattern.count("]"):
+                self.errors.append(
+                    ParseError(
+                        self.filename,
+                        line_no,
+                        "pattern",
+                        "unbalanced [] in pattern",
+                        fatal=False,
+                    )
+                )
+                continue
+
+            if output.count("[") != output.count("]"):
+                self.errors.append(
+                    ParseError(
+                        self.filename,
+                        line_no,
+                        "output",
+                        "unbalanced [] in output",
+                        fatal=False,
+                    )
+                )
+                continue
+
+            rule = Rule(level=level, pattern=pattern, output=output, line=line_no, order=order)
+            order += 1
+
+            if level == 0:
+                self.top_rules.append(rule)
+            else:
+                parent = last_by_level.get(level - 1)
+                if parent is None:
+                    self.errors.append(
+                        ParseError(
+                            self.filename,
+                            line_no,
+                            "nesting",
+                            f"u{level} has no active parent u{level-1}",
+                            fatal=False,
                         )
-                        continue
-                    parent.children.append(rule)
+                    )
+                    continue
+                parent.children.append(rule)
 
-                last_by_level[level] = rule
-                for k in list(last_by_level.keys()):
-                    if k > level:
-                        del last_by_level[k]
+            last_by_level[level] = rule
+            for k in list(last_by_level.keys()):
+                if k > level:
+                    del last_by_level[k]
 
         if not self.top_rules:
             self.errors.append(
@@ -294,6 +435,65 @@ class DialogEngine:
                 )
             )
 
+    def _compile_rules(self, rules: List[Rule]) -> RuleIndex:
+        # Compile every pattern once at load; definitions may appear after the
+        # rules that use them, so this runs after the whole file is parsed.
+        for rule in rules:
+            rx, capture_slots, err = self._compile_pattern(rule.pattern)
+            if err or rx is None:
+                self.errors.append(
+                    ParseError(
+                        self.filename,
+                        rule.line,
+                        "pattern",
+                        str(err),
+                        fatal=False,
+                    )
+                )
+            else:
+                rule.regex = rx
+                rule.capture_slots = capture_slots
+                rule.leading_words = self._leading_words(rule.pattern)
+            rule.child_index = self._compile_rules(rule.children)
+        return RuleIndex(rules)
+
+    def _leading_words(self, pattern: str) -> Optional[FrozenSet[str]]:
+        # Normalized first word(s) a pattern can start with, or None when the
+        # pattern starts with a capture or anything we don't want to guess at.
+        text = pattern.lstrip()
+        if not text or text[0] == "_":
+            return None
+
+        if text[0] == "[":
+            end = _find_matching_bracket(text, 0)
+            try:
+                items = parse_choice_items(text[1:end])
+            except ValueError:
+                return None
+            phrases: List[str] = []
+            for item in items:
+                if item.startswith("~"):
+                    phrases.extend(self.definitions.get(item[1:], []))
+                else:
+                    phrases.append(item)
+        elif text[0] == '"':
+            end = text.find('"', 1)
+            phrases = [text[1:end]]
+        elif text[0] == "~":
+            name = re.match(r"~([A-Za-z0-9_]*)", text).group(1)
+            phrases = list(self.definitions.get(name, []))
+        else:
+            phrases = [re.split(r'[\s\[\]"]', text, maxsplit=1)[0]]
+
+        words = set()
+        for phrase in phrases:
+            norm = normalize_text(phrase)
+            if not norm:
+                # An option that normalizes away would let the next token lead.
+                return None
+            words.add(norm.split(" ", 1)[0])
+        return frozenset(words) if words else None
+
     def _compile_pattern(self, pattern: str) -> Tuple[Optional[re.Pattern], List[int], Optional[str]]:
         token_regexes: List[str] = []
         capture_slots: List[int] = []
@@ -390,11 +590,76 @@ class DialogEngine:
         except re.error as ex:
             return None, [], f"regex compile error: {ex}"
 
+
+
+class DialogEngine:
+    """
+    One conversation's state (scope, variables, rng) over a shared DialogScript.
+    """
+
+    def __init__(self, script: DialogScript, seed: Optional[int] = None):
+        self.script = script
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.errors: List[ParseError] = list(script.errors)
+        self.variables: Dict[str, str] = {}
+        self.scope_stack: List[Rule] = []
+        self.unmatched_in_scope = 0
+        self.max_depth = 6  # depth counting top-level u as depth 1
+        self.state = "BOOT" if self.has_fatal_errors() else "IDLE"
+        self.verbose = True
+
+    @classmethod
+    def from_file(cls, filename: str, seed: Optional[int] = None) -> "DialogEngine":
+        return cls(DialogScript.from_file(filename), seed=seed)
+
+    @property
+    def filename(self) -> str:
+        return self.script.filename
+
+    @property
+    def definitions(self) -> Dict[str, List[str]]:
+        return self.script.definitions
+
+    @property
+    def top_rules(self) -> List[Rule]:
+        return self.script.top_rules
+
+    @property
+    def top_index(self) -> Optional[RuleIndex]:
+        return self.script.top_index
+
+    def has_fatal_errors(self) -> bool:
+        return any(e.fatal for e in self.errors)
+
+    def _log(self, msg: str, *args) -> None:
+        if self.verbose:
+            log.info(msg, *args)
+
+    def reset_to_idle(self, reason: str = "") -> None:
+        if reason:
+            self._log("reset to IDLE: %s", reason)
+        self.scope_stack = []
+        self.unmatched_in_scope = 0
+        self.state = "IDLE"
+
+    def interrupt_now(self) -> None:
+        self.reset_to_idle(reason="global interrupt")
+
+    def current_scope_depth(self) -> int:
+        return len(self.scope_stack)
+
+    def _set_scope_state(self) -> None:
+        if self.scope_stack:
+            self.state = f"IN_SCOPE({len(self.scope_stack)})"
+        else:
+            self.state = "IDLE"
+
     def _render_output(self, text: str, captures: Optional[List[str]] = None) -> str:
         # Expand [ ... ] choices in output randomly.
         rendered = text
         for _ in range(20):
-            match = re.search(r"\[([^\[\]]+)\]", rendered)
+            match = CHOICE_RE.search(rendered)
             if not match:
                 break
             raw = match.group(1)
@@ -406,8 +671,6 @@ class DialogEngine:
             rendered = rendered[: match.start()] + replacement + rendered[match.end() :]
 
         # Expand ~definition in output to random option.
-        def_re = re.compile(r"~([A-Za-z_][A-Za-z0-9_]*)")
-
         def repl_def(m: re.Match) -> str:
             name = m.group(1)
             vals = self.definitions.get(name)
@@ -415,7 +678,7 @@ class DialogEngine:
                 return ""
             return self.rng.choice(vals)
 
-        rendered = def_re.sub(repl_def, rendered)
+        rendered = DEF_REF_RE.sub(repl_def, rendered)
 
         # Replace positional captures ($1, $2, ...).
         cap_values = captures or []
@@ -445,23 +708,21 @@ class DialogEngine:
         spoken = SPACE_RE.sub(" ", spoken).strip()
         return spoken, actions
 
-    def _find_match(self, rules: List[Rule], normalized_input: str) -> Optional[Tuple[Rule, re.Match]]:
+    def _find_match(
+        self, index: Optional[RuleIndex], normalized_input: str
+    ) -> Optional[Tuple[Rule, List[str]]]:
+        if index is None:
+            return None
+        return index.match(normalized_input)
+
+    def _scan_rules(self, rules: List[Rule], normalized_input: str) -> Optional[Tuple[Rule, List[str]]]:
+        # Reference linear scan; kept for benchmarking against RuleIndex.
         for rule in rules:
-            rx, _, err = self._compile_pattern(rule.pattern)
-            if err or rx is None:
-                self.errors.append(
-                    ParseError(
-                        self.filename,
-                        rule.line,
-                        "pattern",
-                        f"runtime pattern error: {err}",
-                        fatal=False,
-                    )
-                )
+            if rule.regex is None:
                 continue
-            m = rx.match(normalized_input)
+            m = rule.regex.match(normalized_input)
             if m:
-                return (rule, m)
+                return (rule, list(m.groups()))
         return None
 
     def handle_input(self, user_text: str) -> Dict[str, object]:
@@ -494,19 +755,19 @@ class DialogEngine:
                 "ok": True,
                 "matched": True,
                 "state": self.state,
-                "speak_text": "Stopping now.",
+                "speak_text": STOP_REPLY,
                 "actions": [],
                 "interrupt": True,
             }
 
-        scoped_rules: List[Rule] = []
+        scoped_index: Optional[RuleIndex] = None
         if self.scope_stack:
-            scoped_rules = list(self.scope_stack[-1].children)
+            scoped_index = self.scope_stack[-1].child_index
 
-        matched = self._find_match(scoped_rules, normalized)
+        matched = self._find_match(scoped_index, normalized)
         used_scoped = matched is not None
         if matched is None:
-            matched = self._find_match(self.top_rules, normalized)
+            matched = self._find_match(self.top_index, normalized)
             used_scoped = False
 
         if matched is None:
@@ -514,7 +775,7 @@ class DialogEngine:
                 self.unmatched_in_scope += 1
                 if self.unmatched_in_scope >= 4:
                     self.reset_to_idle("4 unmatched inputs in nested scope")
-            print(f"[DIALOG] no match for input='{user_text}' state={self.state}")
+            self._log("no match for input='%s' state=%s", user_text, self.state)
             self._set_scope_state()
             return {
                 "ok": True,
@@ -525,7 +786,7 @@ class DialogEngine:
                 "interrupt": False,
             }
 
-        rule, match_obj = matched
+        rule, raw_captures = matched
         self.unmatched_in_scope = 0
 
         # Guard against activating depth beyond max_depth.
@@ -558,10 +819,9 @@ class DialogEngine:
         else:
             self.scope_stack = [rule]
 
-        _, capture_slots, _ = self._compile_pattern(rule.pattern)
         captures: List[str] = []
-        if capture_slots:
-            captures = [g.strip() for g in match_obj.groups()]
+        if rule.capture_slots:
+            captures = [g.strip() for g in raw_captures]
             # Support explicit assignments in output, e.g. $name=$1
             for var_name, pos_str in ASSIGN_RE.findall(rule.output):
                 idx = int(pos_str) - 1
@@ -582,16 +842,232 @@ class DialogEngine:
         rendered = self._render_output(output_text, captures=captures)
         spoken, actions = self._extract_actions(rendered)
         if unknown_output_vars:
-            spoken = "I don't know"
-            print(f"[DIALOG] unknown variable(s) in output: {unknown_output_vars}")
+            spoken = UNKNOWN_REPLY
+            self._log("unknown variable(s) in output: %s", unknown_output_vars)
         self._set_scope_state()
 
-        print(f"[DIALOG] matched line={rule.line} level=u{rule.level} state={self.state}")
+        self._log("matched line=%d level=u%d state=%s", rule.line, rule.level, self.state)
         return {
             "ok": True,
             "matched": True,
+            "line": rule.line,
             "state": self.state,
             "speak_text": spoken,
             "actions": actions,
             "interrupt": False,
         }
+
+    # -------------------------
+    # Batch / offline evaluation
+    # -------------------------
+    def fork(self) -> "DialogEngine":
+        """
+        Fresh conversation over the same DialogScript; variables, scope and
+        rng are new.
+        """
+        eng = DialogEngine(self.script, seed=self.seed)
+        eng.verbose = self.verbose
+        return eng
+
+    def iter_batch(
+        self,
+        inputs: Iterable[str],
+        sessions: Optional[Iterable[str]] = None,
+        quiet: bool = True,
+    ) -> Iterator[Dict[str, object]]:
+        """
+        Replay utterances in order, one forked engine per session id.
+        With sessions=None every input belongs to one conversation.
+        This engine's own conversation state is left untouched.
+        """
+        engines: Dict[str, DialogEngine] = {}
+        session_iter = iter(sessions) if sessions is not None else None
+        for text in inputs:
+            session = next(session_iter) if session_iter is not None else ""
+            eng = engines.get(session)
+            if eng is None:
+                eng = self.fork()
+                eng.verbose = not quiet
+                engines[session] = eng
+            yield _batch_record(session, text, eng.handle_input(text))
+
+    def run_batch(
+        self,
+        inputs: Sequence[str],
+        sessions: Optional[Sequence[str]] = None,
+        quiet: bool = True,
+        processes: Optional[int] = None,
+    ) -> List[Dict[str, object]]:
+        """
+        Evaluate many utterances and return one result per input, in input order.
+        processes > 1 runs each session in its own engine on a process pool.
+        """
+        if sessions is not None and len(sessions) != len(inputs):
+            raise ValueError("sessions must be the same length as inputs")
+        if not processes or processes <= 1:
+            return list(self.iter_batch(inputs, sessions, quiet=quiet))
+
+        # Group by session, keeping each conversation's utterances in order.
+        groups: Dict[str, List[int]] = {}
+        for i in range(len(inputs)):
+            groups.setdefault(sessions[i] if sessions is not None else "", []).append(i)
+
+        results: List[Dict[str, object]] = [{} for _ in inputs]
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_batch_worker, initargs=(self.filename,)
+        ) as pool:
+            futures = {
+                pool.submit(
+                    _run_conversation,
+                    self.seed,
+                    session,
+                    [inputs[i] for i in idxs],
+                    quiet,
+                ): idxs
+                for session, idxs in groups.items()
+            }
+            for fut, idxs in futures.items():
+                for i, record in zip(idxs, fut.result()):
+                    results[i] = record
+        return results
+
+
+class DialogSessions:
+    """
+    Thread-safe map of session id -> DialogEngine over one shared DialogScript.
+    The store lock only guards the dict; each session has its own lock, so
+    different conversations never wait on each other. The least recently
+    used session is dropped once max_sessions is exceeded.
+    """
+
+    def __init__(self, script: DialogScript, seed: Optional[int] = None, max_sessions: int = 256):
+        self.script = script
+        self.seed = seed
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Tuple[DialogEngine, threading.Lock]]" = OrderedDict()
+
+    def get(self, session_id: str) -> Tuple[DialogEngine, threading.Lock]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = (DialogEngine(self.script, seed=self.seed), threading.Lock())
+                self._sessions[session_id] = entry
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return entry
+
+    def peek(self, session_id: str) -> Optional[DialogEngine]:
+        # Read-only lookup; does not create a session or touch LRU order.
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        return entry[0] if entry is not None else None
+
+    def reset_all(self, reason: str = "") -> None:
+        with self._lock:
+            entries = list(self._sessions.values())
+        for eng, lock in entries:
+            with lock:
+                eng.reset_to_idle(reason)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+
+def _batch_record(session: str, text: str, result: Dict[str, object]) -> Dict[str, object]:
+    return {
+        "session": session,
+        "input": text,
+        "ok": result.get("ok", False),
+        "matched": result.get("matched", False),
+        "line": result.get("line"),
+        "speak_text": result.get("speak_text", ""),
+        "actions": result.get("actions", []),
+        "state": result.get("state"),
+        "interrupt": result.get("interrupt", False),
+    }
+
+
+# Script parsed once per process-pool worker by _init_batch_worker and shared
+# by every conversation that worker runs.
+_WORKER_SCRIPT: Optional[DialogScript] = None
+
+
+def _init_batch_worker(filename: str) -> None:
+    global _WORKER_SCRIPT
+    _WORKER_SCRIPT = DialogScript.from_file(filename)
+
+
+def _run_conversation(
+    seed: Optional[int], session: str, texts: List[str], quiet: bool
+) -> List[Dict[str, object]]:
+    # Process-pool worker: a fresh engine over the worker's parsed script.
+    eng = DialogEngine(_WORKER_SCRIPT, seed=seed)
+    return list(eng.iter_batch(texts, [session] * len(texts), quiet=quiet))
+
+
+def _read_jsonl_utterances(f) -> Iterator[Tuple[str, str]]:
+    # Each line is {"text": ..., "session": ...} (session optional) or a bare JSON string.
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, str):
+            yield "", item
+        else:
+            yield str(item.get("session", "")), str(item.get("text", ""))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a JSONL file of utterances through a dialog script")
+    parser.add_argument("script", help="Path to dialog script file")
+    parser.add_argument("input", help="JSONL utterances, one {\"text\", \"session\"} per line")
+    parser.add_argument("output", help="JSONL results file ('-' for stdout)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None, help="Run sessions on a process pool")
+    parser.add_argument("--verbose", action="store_true", help="Keep the engine's [DIALOG] prints")
+    args = parser.parse_args(argv)
+
+    eng = DialogEngine.from_file(args.script, seed=args.seed)
+    eng.verbose = args.verbose
+    for err in eng.errors:
+        print(f"[DIALOG PARSE] {err}", file=sys.stderr)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output != "-" else None
+    try:
+        with open(args.input, "r", encoding="utf-8") as f:
+            pairs = _read_jsonl_utterances(f)
+            if args.processes and args.processes > 1:
+                pairs = list(pairs)
+                records: Iterable[Dict[str, object]] = eng.run_batch(
+                    [t for _, t in pairs],
+                    sessions=[s for s, _ in pairs],
+                    quiet=not args.verbose,
+                    processes=args.processes,
+                )
+            else:
+                # Stream: one line in, one line out (tee stays one item deep).
+                for_sessions, for_texts = itertools.tee(pairs)
+                records = eng.iter_batch(
+                    (t for _, t in for_texts),
+                    sessions=(s for s, _ in for_sessions),
+                    quiet=not args.verbose,
+                )
+            for record in records:
+                line = json.dumps(record)
+                if out is None:
+                    print(line)
+                else:
+                    out.write(line + "\n")
+    finally:
+        if out is not None:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import robot_log
+
+# Fixed-rate wheel control.
+#
+# Drive commands only update a shared setpoint; one thread applies it to the
+# wheels at rate_hz. Between ticks the output moves toward the setpoint by at
+# most slew_per_s, and a setpoint that no drive command has renewed within
+# lease_s falls back to neutral. Serial traffic is at most one drive update
+# per tick no matter how many clients are posting.
+
+log = robot_log.get("DRIVE")
+
+
+class DriveLoop:
+    def __init__(self, apply, rate_hz=50.0, slew_per_s=6000.0, lease_s=0.5, deadband=0):
+        """
+        apply(left, right) writes one output to the wheels (speed deltas, as
+        RobotControl.drive takes them). Outputs never rest inside the motor
+        deadband (0 < |v| < deadband); the ramp steps across it.
+        """
+        self.apply = apply
+        self.deadband = deadband
+        self.period = 1.0 / rate_hz
+        self.slew_step = slew_per_s * self.period
+        self.lease_s = lease_s
+        self.lock = threading.Lock()
+        self.setpoint = (0, 0)
+        self.output = (0, 0)
+        self.lease_until = 0.0
+        self.ticks = 0
+        self.writes = 0
+        self.expiries = 0
+        self.late_ticks = 0
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def set(self, left, right):
+        with self.lock:
+            self.setpoint = (int(left), int(right))
+            self.lease_until = time.monotonic() + self.lease_s
+
+    def reset(self):
+        """
+        Forget setpoint and output without writing; the caller has already
+        put the wheels at neutral (stop / force stop).
+        """
+        with self.lock:
+            self.setpoint = (0, 0)
+            self.output = (0, 0)
+
+    def close(self):
+        self._stop.set()
+        self.thread.join(timeout=1.0)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "rate_hz": round(1.0 / self.period, 1),
+                "setpoint": list(self.setpoint),
+                "output": list(self.output),
+                "ticks": self.ticks,
+                "writes": self.writes,
+                "lease_expiries": self.expiries,
+                "late_ticks": self.late_ticks,
+            }
+
+    def _slew(self, current, target):
+        if target > current:
+            value = min(target, current + self.slew_step)
+        else:
+            value = max(target, current - self.slew_step)
+        if 0 < abs(value) < self.deadband:
+            # Toward zero: finish the stop; away from zero: start at the
+            # smallest speed that moves.
+            if abs(target) < abs(current) or (target > 0) != (value > 0):
+                value = 0
+            else:
+                value = self.deadband if value > 0 else -self.deadband
+        return value
+
+    def _loop(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            next_tick += self.period
+            wait = next_tick - time.monotonic()
+            if wait > 0:
+                if self._stop.wait(wait):
+                    return
+            elif wait < -self.period:
+                # Fell more than a tick behind; skip ahead instead of bursting.
+                self.late_ticks += 1
+                next_tick = time.monotonic()
+
+            with self.lock:
+                self.ticks += 1
+                if self.setpoint != (0, 0) and time.monotonic() > self.lease_until:
+                    self.setpoint = (0, 0)
+                    self.expiries += 1
+                    log.warning("setpoint lease expired -> neutral")
+                left = int(self._slew(self.output[0], self.setpoint[0]))
+                right = int(self._slew(self.output[1], self.setpoint[1]))
+                if (left, right) == self.output:
+                    continue
+                self.output = (left, right)
+                self.writes += 1
+                # Applied under the lock so a concurrent reset() (stop) can't
+                # be followed by a stale drive write.
+                try:
+                    self.apply(left, right)
+                except Exception as ex:
+                    log.error("apply failed: %s", ex)
@@ -1,12 +1,16 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
 from robot_control import RobotControl
-from dialog_engine import DialogEngine
+from dialog_engine import DialogScript, DialogSessions
 from action_runner import ActionRunner
+from speech import TTSWorker, WavCache
+from state_stream import StateStream
+import robot_log
+import ws_channel
+from trajectory import PROFILES, Trajectory
 
 import logging
 from werkzeug.serving import WSGIRequestHandler
 import threading
-import subprocess
 import re
 import time
 import os
@@ -20,43 +24,255 @@ class QuietHandler(WSGIRequestHandler):
             return
         super().log_request(code, size)
 
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="CSCI 455 Robot Flask Server + Dialog Engine")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument(
+        "--dialog-script",
+        default=os.path.join(os.path.dirname(__file__), "testDialogFileForPractice.txt"),
+        help="Path to dialog script file",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Random seed for deterministic dialog output choices",
+    )
+    parser.add_argument(
+        "--watch-dialog",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="Poll the dialog script every SECONDS and hot-reload it on change (0 = off)",
+    )
+    parser.add_argument(
+        "--coalesce-ms",
+        type=float,
+        default=None,
+        metavar="MS",
+        help="Skip servo writes that repeat the current target; if MS > 0 also "
+             "merge updates to the same channel within MS milliseconds",
+    )
+    parser.add_argument(
+        "--maestro-port",
+        default=os.environ.get("MAESTRO_PORT", "/dev/ttyACM0"),
+        help="Maestro command port (default $MAESTRO_PORT or /dev/ttyACM0)",
+    )
+    parser.add_argument(
+        "--sim",
+        action="store_true",
+        help="Use the in-process simulated Maestro instead of hardware",
+    )
+    parser.add_argument(
+        "--drive-hz",
+        type=float,
+        default=50.0,
+        help="Apply drive setpoints on a fixed-rate control thread at this rate (0 = write inline)",
+    )
+    parser.add_argument(
+        "--drive-slew",
+        type=float,
+        default=6000.0,
+        metavar="UNITS_PER_S",
+        help="Max change of each wheel's drive command per second",
+    )
+    parser.add_argument(
+        "--drive-lease-ms",
+        type=float,
+        default=500.0,
+        help="Drop back to neutral if no drive command renews the setpoint within this time",
+    )
+    parser.add_argument(
+        "--tts-cache",
+        default=None,
+        metavar="DIR",
+        help="Cache synthesized replies as WAV files in DIR and play them with aplay",
+    )
+    parser.add_argument(
+        "--tts-cache-mb",
+        type=float,
+        default=64.0,
+        help="Size cap of the TTS cache in MB; least recently used files go first",
+    )
+    parser.add_argument(
+        "--tts-prerender",
+        action="store_true",
+        help="Render every static reply of the dialog script into the TTS cache at load",
+    )
+    parser.add_argument(
+        "--log",
+        default="",
+        help="Log levels, e.g. 'warning' or 'info,SERVO=debug,MOTOR=debug' (added to ROBOT_LOG)",
+    )
+    return parser
+
+
+# The controller is created at import time, so options are parsed up front.
+# When imported (not run), defaults apply; MAESTRO_PORT=sim selects the simulator.
+args = build_arg_parser().parse_args(None if __name__ == "__main__" else [])
+robot_log.configure(args.log)
+log = robot_log.get("FLASK")
+dialog_log = robot_log.get("DIALOG")
+parse_log = robot_log.get("DIALOG PARSE")
+watchdog_log = robot_log.get("WATCHDOG")
+
 app = Flask(__name__)
 
 # One shared controller instance for the server
-ctrl = RobotControl(port="/dev/ttyACM0", device=0x0C)
-dialog_lock = threading.Lock()
-dialog_engine = None
+ctrl = RobotControl(port="sim" if args.sim else args.maestro_port, device=0x0C)
+# Serial I/O runs on the controller's writer thread so request handlers only
+# enqueue; stops jump ahead of queued pose commands.
+ctrl.maestro.startWriter()
+if args.coalesce_ms is not None:
+    ctrl.maestro.setCoalescing(True, max(args.coalesce_ms, 0.0) / 1000.0)
+# Drive requests only set a setpoint; the control thread owns wheel writes.
+if args.drive_hz > 0:
+    ctrl.start_drive_loop(rate_hz=args.drive_hz, slew_per_s=args.drive_slew, lease_s=args.drive_lease_ms / 1000.0)
+# One parsed script shared by every conversation; per-client state lives in
+# dialog_sessions, keyed by the "session" id each request carries.
+# dialog_sessions (and the script it holds) is swapped as one reference on
+# reload; handlers read it once per request.
+dialog_sessions = None
+dialog_script_path = None
+dialog_seed = None
+dialog_reload_lock = threading.Lock()
 action_runner = None
-dialog_state_override = None
+DEFAULT_SESSION = "default"
+MAX_SESSION_ID_LEN = 64
+MAX_PUBLISHED_SESSIONS = 256
+# Published state, read lock-free by handlers and /api/state_stream:
+#   override  robot-wide dialog state (EXEC_ACTIONS while the ActionRunner is
+#             busy), or None
+#   sessions  session id -> dialog state, for sessions not at IDLE
+#   watchdog  last heartbeat trip, and whether it is still tripped
+#   targets   current servo targets by channel (sampled by the watchdog)
+state = StateStream(
+    override=None,
+    sessions={},
+    watchdog={"tripped": False, "reason": None, "at": None},
+    targets=[],
+)
 
 
 def set_dialog_state(value: Optional[str]):
-    global dialog_state_override
-    with dialog_lock:
-        dialog_state_override = value
+    state.publish(override=value)
+
+
+def publish_session_state(session_id: str, value: str):
+    def apply(current):
+        sessions = {sid: v for sid, v in current.items() if sid != session_id}
+        if value != "IDLE":
+            sessions[session_id] = value
+            while len(sessions) > MAX_PUBLISHED_SESSIONS:
+                del sessions[next(iter(sessions))]
+        return sessions
+
+    state.update("sessions", apply)
+
 
+def get_dialog_state(session_id: str = DEFAULT_SESSION) -> str:
+    override = state.snapshot["override"]
+    if override is not None:
+        return override
+    sessions = dialog_sessions
+    if sessions is None:
+        return "BOOT"
+    eng = sessions.peek(session_id)
+    if eng is None:
+        return "BOOT" if sessions.script.has_fatal_errors() else "IDLE"
+    return eng.state
 
-def get_dialog_state() -> str:
-    with dialog_lock:
-        if dialog_state_override is not None:
-            return dialog_state_override
-        if dialog_engine is None:
-            return "BOOT"
-        return dialog_engine.state
+
+def reset_dialog_sessions(reason: str):
+    sessions = dialog_sessions
+    if sessions is not None:
+        sessions.reset_all(reason)
+    state.publish(sessions={})
 
 
 def configure_dialog_engine(script_path: str, seed: int | None):
-    global dialog_engine, action_runner, dialog_state_override
+    global dialog_sessions, dialog_script_path, dialog_seed, action_runner
     if action_runner is not None:
         action_runner.interrupt()
-    dialog_engine = DialogEngine.from_file(script_path, seed=seed)
-    for err in dialog_engine.errors:
-        print(f"[DIALOG PARSE] {err}")
-    if dialog_engine.has_fatal_errors():
-        print("[DIALOG] fatal errors found; dialog engine will refuse to run")
-    action_runner = ActionRunner(ctrl, on_state_change=set_dialog_state)
-    dialog_state_override = None
-    print(f"[DIALOG] loaded script={script_path} seed={seed}")
+    script = DialogScript.load(script_path)
+    for err in script.errors:
+        parse_log.info("%s", err)
+    if script.has_fatal_errors():
+        dialog_log.error("fatal errors found; dialog engine will refuse to run")
+    dialog_sessions = DialogSessions(script, seed=seed)
+    dialog_script_path = script_path
+    dialog_seed = seed
+    prerender_dialog_outputs(script)
+    # The action worker lives for the whole process; only create it once.
+    if action_runner is None:
+        action_runner = ActionRunner(ctrl, on_state_change=set_dialog_state, on_interrupt=on_action_interrupt)
+    state.publish(override=None, sessions={})
+    dialog_log.info("loaded script=%s seed=%s", script_path, seed)
+
+
+def reload_dialog_script() -> dict:
+    """
+    Re-parse the configured dialog script and swap it in. Runs on the
+    caller's thread (request or watcher); other requests keep using the old
+    script until the swap. Unchanged files hit DialogScript.load's cache. A
+    script with fatal errors is reported but not swapped in. Conversations
+    restart at IDLE.
+    """
+    global dialog_sessions
+    path = dialog_script_path
+    with dialog_reload_lock:
+        old = dialog_sessions
+        try:
+            script = DialogScript.load(path)
+        except (OSError, ValueError) as ex:
+            # ValueError covers UnicodeDecodeError from a half-saved or
+            # non-UTF-8 file.
+            return {"ok": False, "error": f"cannot read {path}: {ex}"}
+        errors = [str(e) for e in script.errors]
+        if script.has_fatal_errors():
+            dialog_log.error("reload of %s rejected: fatal errors", path)
+            return {"ok": False, "error": "dialog script has fatal errors", "errors": errors}
+        changed = old is None or old.script is not script
+        if changed:
+            for err in errors:
+                parse_log.info("%s", err)
+            dialog_sessions = DialogSessions(script, seed=dialog_seed)
+            state.publish(sessions={})
+            prerender_dialog_outputs(script)
+            dialog_log.info("reloaded script=%s", path)
+        return {"ok": True, "script": path, "changed": changed, "errors": errors}
+
+
+def dialog_watch_loop(period_s: float):
+    """
+    Background thread: reload the dialog script whenever its mtime changes.
+    """
+    last_mtime = None
+    while True:
+        time.sleep(period_s)
+        try:
+            mtime = os.stat(dialog_script_path).st_mtime_ns
+        except OSError:
+            continue
+        if last_mtime is not None and mtime != last_mtime:
+            # A bad edit must not end the watcher; the next save retries.
+            try:
+                result = reload_dialog_script()
+                if not result["ok"]:
+                    dialog_log.warning("reload failed: %s", result["error"])
+            except Exception as e:
+                dialog_log.error("reload failed: %s", e)
+        last_mtime = mtime
+
+
+def get_session_id(data=None):
+    """
+    Session id from the JSON body or ?session= query arg; None if invalid.
+    """
+    sid = (data or {}).get("session", request.args.get("session", DEFAULT_SESSION))
+    if not isinstance(sid, str) or not sid or len(sid) > MAX_SESSION_ID_LEN:
+        return None
+    return sid
 
 def bad(msg, code=400):
     return jsonify({"ok": False, "error": msg}), code
@@ -70,49 +286,62 @@ HEARTBEAT_TIMEOUT_S = 1.0   # if we haven't heard from browser in this many seco
 WATCHDOG_PERIOD_S = 0.1     # how often watchdog checks
 
 _last_heartbeat = time.time()
+FORCE_STOP_HOLD_S = 3.0     # keep re-sending neutral wheel targets this long
+FORCE_STOP_PERIOD_S = 0.05
+
 _force_stop_lock = threading.Lock()
 _force_stop_running = False
+# Trigger -> first neutral frame on the wire, per force stop.
+_force_stop_stats = {"count": 0, "last_reason": None, "last_latency_ms": None, "max_latency_ms": None}
 
 def touch_heartbeat():
     global _last_heartbeat
     _last_heartbeat = time.time()
 
-def run_force_stop_async(reason: str):
+def run_force_stop_async(reason: str, triggered_at: Optional[float] = None):
     """
-    Runs force_stop.py in the background, but prevents overlap.
+    Emergency stop in-process: the hold loop runs on its own thread and
+    drives the wheels through ctrl's urgent write path, so neutral jumps any
+    queued servo traffic. Overlapping triggers are ignored while it runs.
     """
     global _force_stop_running
+    if triggered_at is None:
+        triggered_at = time.monotonic()
 
     with _force_stop_lock:
         if _force_stop_running:
             return
         _force_stop_running = True
 
+    def record(latency: float):
+        with _force_stop_lock:
+            stats = _force_stop_stats
+            stats["count"] += 1
+            stats["last_reason"] = reason
+            stats["last_latency_ms"] = round(latency * 1000.0, 3)
+            stats["max_latency_ms"] = max(stats["max_latency_ms"] or 0.0, stats["last_latency_ms"])
+
     def worker():
         global _force_stop_running
         try:
-            print(f"[WATCHDOG] FORCE STOP triggered: {reason}")
-            if action_runner is not None:
-                action_runner.interrupt()
-            if dialog_engine is not None:
-                dialog_engine.reset_to_idle("watchdog force stop")
-
-            # Prefer your dedicated script (exactly what you asked for)
-            script_path = os.path.join(os.path.dirname(__file__), "force_stop.py")
-            if os.path.exists(script_path):
-                subprocess.run(["python3", script_path], check=False)
-            else:
-                print("[WATCHDOG] force_stop.py not found рядом с flaskServer.py; falling back to ctrl.stop()")
-                try:
-                    ctrl.stop()
-                except Exception as e:
-                    print(f"[WATCHDOG] ctrl.stop() failed: {e}")
-
+            ctrl.force_stop(
+                hold_s=FORCE_STOP_HOLD_S,
+                period_s=FORCE_STOP_PERIOD_S,
+                triggered_at=triggered_at,
+                on_first_neutral=record,
+            )
+        except Exception as e:
+            watchdog_log.error("force stop failed: %s", e)
         finally:
             with _force_stop_lock:
                 _force_stop_running = False
 
     threading.Thread(target=worker, daemon=True).start()
+    watchdog_log.warning("FORCE STOP triggered: %s", reason)
+    state.publish(watchdog={"tripped": True, "reason": reason, "at": time.time()})
+    if action_runner is not None:
+        action_runner.interrupt()
+    reset_dialog_sessions("watchdog force stop")
 
 def watchdog_loop():
     """
@@ -124,15 +353,21 @@ def watchdog_loop():
 
     while True:
         time.sleep(WATCHDOG_PERIOD_S)
+        # Servo targets go out at this rate too; unchanged targets publish nothing.
+        state.publish(targets=list(ctrl.maestro.Targets))
         age = time.time() - _last_heartbeat
 
         if age > HEARTBEAT_TIMEOUT_S:
             # Only trigger once per outage
             if not timed_out:
-                run_force_stop_async(f"heartbeat timeout ({age:.2f}s > {HEARTBEAT_TIMEOUT_S}s)")
+                run_force_stop_async(
+                    f"heartbeat timeout ({age:.2f}s > {HEARTBEAT_TIMEOUT_S}s)", triggered_at=time.monotonic()
+                )
                 timed_out = True
         else:
             # Heartbeat is healthy again -> allow future triggers
+            if timed_out:
+                state.update("watchdog", lambda w: dict(w, tripped=False))
             timed_out = False
 
 
@@ -150,17 +385,68 @@ def sanitize_tts(text: str) -> str:
     text = re.sub(r"\s+", " ", text).strip()
     return text
 
+# One warm espeak-ng engine (or WAV cache + player) for the whole server;
+# replies are spoken in order and cut off whenever the ActionRunner is
+# interrupted (stop, barge-in).
+tts_cache = None
+if args.tts_cache:
+    tts_cache = WavCache(args.tts_cache, max_bytes=int(args.tts_cache_mb * 1024 * 1024))
+tts = TTSWorker(cache=tts_cache)
+tts.warm_up()
+
+
+def prerender_dialog_outputs(script):
+    """
+    Render the script's static replies into the TTS cache in the background.
+    """
+    if tts_cache is None or not args.tts_prerender:
+        return
+
+    def run():
+        texts = script.static_outputs()
+        t0 = time.monotonic()
+        rendered = tts_cache.prerender(texts)
+        robot_log.get("TTS").info("pre-rendered %d/%d replies in %.1fs", rendered, len(texts), time.monotonic() - t0)
+
+    threading.Thread(target=run, daemon=True).start()
+
 def speak_async(text: str):
+    tts.speak(text)
+
+
+# =========================
+# Interrupt hooks
+# =========================
+
+# Timed /api/pose moves run on their own thread; a new one, or any
+# ActionRunner interrupt (stop, barge-in, force stop), cancels the last.
+pose_motion_lock = threading.Lock()
+pose_cancel_event = threading.Event()
+
+
+def on_action_interrupt():
+    tts.cancel()
+    with pose_motion_lock:
+        pose_cancel_event.set()
+
+
+def start_pose_motion(traj: Trajectory):
+    global pose_cancel_event
+    with pose_motion_lock:
+        pose_cancel_event.set()
+        cancel = pose_cancel_event = threading.Event()
+    deadline = time.monotonic() + traj.duration + 1.0
+
     def run():
         try:
-            subprocess.run(["espeak-ng", "-s", "165", "-v", "en-us", text], check=False)
-        except FileNotFoundError:
-            print(f"[TTS WARN] espeak-ng not installed; cannot speak: {text}")
+            ctrl.play_trajectory(traj, cancel_event=cancel, deadline=deadline)
+        except Exception as e:
+            run_force_stop_async(f"pose trajectory exception: {e}")
+
     threading.Thread(target=run, daemon=True).start()
 
 
-DEFAULT_DIALOG_SCRIPT = os.path.join(os.path.dirname(__file__), "testDialogFileForPractice.txt")
-configure_dialog_engine(DEFAULT_DIALOG_SCRIPT, seed=None)
+configure_dialog_engine(args.dialog_script, args.seed)
 
 
 @app.route("/")
@@ -183,8 +469,7 @@ def api_heartbeat():
 def api_force_stop():
     if action_runner is not None:
         action_runner.interrupt()
-    if dialog_engine is not None:
-        dialog_engine.reset_to_idle("manual force stop")
+    reset_dialog_sessions("manual force stop")
     run_force_stop_async("manual /api/force_stop")
     return jsonify({"ok": True})
 
@@ -193,6 +478,25 @@ def api_force_stop():
 # DRIVE API
 # =========================
 
+DRIVE_LIMIT = 3000
+
+
+def apply_drive(left: int, right: int):
+    """
+    Range-check and apply a tank drive command. Returns (error, http_code),
+    or (None, 200) on success. Shared by /api/drive and the control channel.
+    """
+    if abs(left) > DRIVE_LIMIT or abs(right) > DRIVE_LIMIT:
+        return "left/right out of allowed range", 400
+
+    try:
+        ctrl.drive(left, right)
+    except Exception as e:
+        run_force_stop_async(f"drive exception: {e}")
+        return f"drive failed: {e}", 500
+    return None, 200
+
+
 @app.route("/api/drive", methods=["POST"])
 def api_drive():
     touch_heartbeat()  # treat commands as “activity” too
@@ -207,14 +511,9 @@ def api_drive():
     except (ValueError, TypeError):
         return bad("left/right must be integers")
 
-    if abs(left) > 3000 or abs(right) > 3000:
-        return bad("left/right out of allowed range")
-
-    try:
-        ctrl.drive(left, right)
-    except Exception as e:
-        run_force_stop_async(f"drive exception: {e}")
-        return bad(f"drive failed: {e}", code=500)
+    error, code = apply_drive(left, right)
+    if error:
+        return bad(error, code=code)
 
     return jsonify({"ok": True, "left": left, "right": right})
 
@@ -289,8 +588,7 @@ def api_stop():
     try:
         if action_runner is not None:
             action_runner.interrupt()
-        if dialog_engine is not None:
-            dialog_engine.reset_to_idle("manual stop")
+        reset_dialog_sessions("manual stop")
         ctrl.stop()
     except Exception as e:
         run_force_stop_async(f"stop exception: {e}")
@@ -307,6 +605,84 @@ def api_center():
         run_force_stop_async(f"center exception: {e}")
         return bad(f"center failed: {e}", code=500)
     return jsonify({"ok": True})
+
+
+# =========================
+# CONTROL CHANNEL (WebSocket)
+# =========================
+#
+# One long-lived socket per browser carrying compact text frames instead of
+# a POST per command (ws_channel, on the development server's own socket).
+# Every frame counts as a heartbeat.
+#   h                  heartbeat only
+#   d <left> <right>   tank drive, same limits as /api/drive
+#   j <joint> <value>  head_pan / head_tilt / waist / arm joint
+#   s                  stop (same as /api/stop)
+# The server only answers on errors: "e <message>".
+
+CONTROL_JOINTS = {"head_pan", "head_tilt", "waist", *ctrl.robot.ARM_JOINTS}
+
+
+def handle_control_frame(frame: str) -> Optional[str]:
+    touch_heartbeat()
+    parts = frame.split()
+    if not parts:
+        return "e empty frame"
+    kind = parts[0]
+    if not ((kind in ("h", "s") and len(parts) == 1) or (kind in ("d", "j") and len(parts) == 3)):
+        return f"e bad frame {frame!r}"
+    # Parse everything first, so only frame errors are reported as such and
+    # any failure in the controller below still forces a stop.
+    try:
+        numbers = [int(p) for p in parts[1:]] if kind == "d" else [int(p) for p in parts[2:]]
+    except ValueError:
+        return f"e bad number in {frame!r}"
+    if kind == "j" and parts[1] not in CONTROL_JOINTS:
+        return f"e unknown joint {parts[1]}"
+
+    try:
+        if kind == "d":
+            error, _ = apply_drive(numbers[0], numbers[1])
+            return f"e {error}" if error else None
+        if kind == "j":
+            getattr(ctrl, parts[1])(numbers[0])
+        elif kind == "s":
+            if action_runner is not None:
+                action_runner.interrupt()
+            reset_dialog_sessions("manual stop")
+            ctrl.stop()
+    except Exception as e:
+        run_force_stop_async(f"control frame exception: {e}")
+        return f"e {kind} failed: {e}"
+    return None
+
+
+# websocket=True: Werkzeug routes upgrade requests only to such rules.
+@app.route("/ws/control", methods=["GET"], websocket=True)
+def ws_control():
+    ws = ws_channel.accept(request.environ)
+    if ws is None:
+        return bad("WebSocket upgrade required")
+    try:
+        while True:
+            frame = ws.receive()
+            if frame is None:
+                break
+            reply = handle_control_frame(frame)
+            if reply is not None:
+                ws.send(reply)
+    except OSError:
+        pass
+    finally:
+        ws.close()
+    return ws_channel.TakenOver()
+
+
+@app.route("/api/control_channel", methods=["GET"])
+def api_control_channel():
+    # Lets the UI skip the WebSocket attempt when the server can't hand over
+    # its socket (anything but Werkzeug's development server).
+    return jsonify({"ok": True, "websocket": "werkzeug.socket" in request.environ, "path": "/ws/control"})
 
 
 # =========================
@@ -444,6 +820,97 @@ def api_left_hand_pinch():
     return _api_arm_joint(ctrl.left_hand_pinch, "left_hand_pinch")
 
 
+# =========================
+# POSE API (batched joints)
+# =========================
+
+@app.route("/api/pose", methods=["POST"])
+def api_pose():
+    """
+    Body {"pose": {joint: value, ...}} sets every joint in one Maestro write.
+    Body {"keyframes": {joint: [[t, value], ...]}, "profile": "min_jerk"}
+    plays a timed motion (see trajectory.py) and returns immediately.
+    All values are validated against the joint limits before anything moves.
+    """
+    touch_heartbeat()
+    data = request.get_json(silent=True) or {}
+    pose = data.get("pose")
+    keyframes = data.get("keyframes")
+    if (pose is None) == (keyframes is None):
+        return bad("send exactly one of 'pose' or 'keyframes'")
+
+    if pose is not None:
+        if not isinstance(pose, dict) or not pose:
+            return bad("pose must be a non-empty object")
+        errors = ctrl.validate_pose(pose)
+        if errors:
+            return jsonify({"ok": False, "error": "invalid pose", "errors": errors}), 400
+        try:
+            ctrl.set_pose(pose)
+        except Exception as e:
+            run_force_stop_async(f"pose exception: {e}")
+            return bad(f"pose failed: {e}", code=500)
+        return jsonify({"ok": True, "pose": pose})
+
+    profile = data.get("profile", "min_jerk")
+    if profile not in PROFILES:
+        return bad(f"profile must be one of {sorted(PROFILES)}")
+    if not isinstance(keyframes, dict) or not keyframes:
+        return bad("keyframes must be a non-empty object")
+    errors = []
+    for name, frames in keyframes.items():
+        if not isinstance(frames, list) or not frames:
+            errors.append(f"{name}: expected a list of [t, value] pairs")
+            continue
+        for frame in frames:
+            if (not isinstance(frame, list) or len(frame) != 2
+                    or not isinstance(frame[0], (int, float)) or isinstance(frame[0], bool)
+                    or not 0 <= frame[0] <= 30):
+                errors.append(f"{name}: bad keyframe {frame!r} (t must be 0..30s)")
+                break
+        else:
+            for _, value in frames:
+                joint_errors = ctrl.validate_pose({name: value})
+                if joint_errors:
+                    errors.extend(joint_errors)
+                    break
+    if errors:
+        return jsonify({"ok": False, "error": "invalid keyframes", "errors": errors}), 400
+    traj = Trajectory(keyframes, profile=profile)
+    start_pose_motion(traj)
+    return jsonify({"ok": True, "duration": traj.duration, "joints": traj.joints()})
+
+
+@app.route("/api/servo_stats", methods=["GET"])
+def api_servo_stats():
+    stats = {"ok": True, **ctrl.maestro.getWriteStats()}
+    if action_runner is not None:
+        stats["gesture_timing"] = action_runner.timing_stats()
+    with _force_stop_lock:
+        stats["force_stop"] = dict(_force_stop_stats)
+    if ctrl.drive_loop is not None:
+        stats["drive"] = ctrl.drive_loop.stats()
+    stats["log"] = robot_log.stats()
+    return jsonify(stats)
+
+
+@app.route("/api/state_stream", methods=["GET"])
+def api_state_stream():
+    """
+    Server-sent events: the published state on connect, then on every change.
+    """
+    return Response(
+        state.events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/tts_stats", methods=["GET"])
+def api_tts_stats():
+    return jsonify({"ok": True, **tts.stats()})
+
+
 # =========================
 # VOICE / TTS API
 # =========================
@@ -470,24 +937,45 @@ def api_speak_text():
 
 @app.route("/api/dialog_state", methods=["GET"])
 def api_dialog_state():
-    if dialog_engine is None:
+    if dialog_sessions is None:
         return jsonify({"ok": False, "error": "dialog engine not configured"}), 500
+    session_id = get_session_id()
+    if session_id is None:
+        return bad("session must be a non-empty string (max 64 chars)")
+    sessions = dialog_sessions
+    # Read-only: polling never creates a session or takes its lock.
+    eng = sessions.peek(session_id)
     return jsonify(
         {
             "ok": True,
-            "state": get_dialog_state(),
-            "scope_depth": dialog_engine.current_scope_depth(),
-            "unmatched_in_scope": dialog_engine.unmatched_in_scope,
-            "fatal_errors": dialog_engine.has_fatal_errors(),
-            "error_count": len(dialog_engine.errors),
+            "session": session_id,
+            "state": get_dialog_state(session_id),
+            "scope_depth": eng.current_scope_depth() if eng is not None else 0,
+            "unmatched_in_scope": eng.unmatched_in_scope if eng is not None else 0,
+            "fatal_errors": sessions.script.has_fatal_errors(),
+            "error_count": len(eng.errors if eng is not None else sessions.script.errors),
+            "session_count": len(sessions),
         }
     )
 
 
+@app.route("/api/dialog_reload", methods=["POST"])
+def api_dialog_reload():
+    if dialog_sessions is None:
+        return bad("dialog engine not configured", code=500)
+    data = request.get_json(silent=True) or {}
+    # Only the script the server was started with (--dialog-script) can be
+    # reloaded; clients never choose a path.
+    if "script" in data:
+        return bad("script cannot be chosen over HTTP; restart with --dialog-script")
+    result = reload_dialog_script()
+    return jsonify(result), (200 if result["ok"] else 400)
+
+
 @app.route("/api/dialog_input", methods=["POST"])
 def api_dialog_input():
     touch_heartbeat()
-    if dialog_engine is None:
+    if dialog_sessions is None:
         return bad("dialog engine not configured", code=500)
 
     # Wheel deadman: any dialog input immediately stops wheel motion,
@@ -495,7 +983,7 @@ def api_dialog_input():
     try:
         ctrl.stop()
     except Exception as ex:
-        print(f"[DIALOG] deadman stop failed: {ex}")
+        dialog_log.error("deadman stop failed: %s", ex)
 
     data = request.get_json(silent=True) or {}
     text = data.get("text", "")
@@ -504,9 +992,16 @@ def api_dialog_input():
     text = sanitize_tts(text)
     if not text:
         return bad("text is empty")
+    session_id = get_session_id(data)
+    if session_id is None:
+        return bad("session must be a non-empty string (max 64 chars)")
 
-    with dialog_lock:
-        result = dialog_engine.handle_input(text)
+    eng, session_lock = dialog_sessions.get(session_id)
+    with session_lock:
+        result = eng.handle_input(text)
+        scope_depth = eng.current_scope_depth()
+        session_state = eng.state
+    publish_session_state(session_id, session_state)
 
     if not result.get("ok", False):
         return jsonify(result), 400
@@ -517,7 +1012,7 @@ def api_dialog_input():
         try:
             ctrl.stop()
         except Exception as ex:
-            print(f"[DIALOG] stop failed on interrupt: {ex}")
+            dialog_log.error("stop failed on interrupt: %s", ex)
 
     speak_text = result.get("speak_text", "")
     if isinstance(speak_text, str) and speak_text:
@@ -532,34 +1027,21 @@ def api_dialog_input():
     return jsonify(
         {
             "ok": True,
+            "session": session_id,
             "input": text,
             "matched": result.get("matched", False),
             "reply": speak_text,
             "actions": actions,
-            "state": get_dialog_state(),
-            "scope_depth": dialog_engine.current_scope_depth(),
+            "state": get_dialog_state(session_id),
+            "scope_depth": scope_depth,
         }
     )
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="CSCI 455 Robot Flask Server + Dialog Engine")
-    parser.add_argument("--port", type=int, default=5000)
-    parser.add_argument(
-        "--dialog-script",
-        default=os.path.join(os.path.dirname(__file__), "testDialogFileForPractice.txt"),
-        help="Path to dialog script file",
-    )
-    parser.add_argument(
-        "--seed",
-        type=int,
-        default=None,
-        help="Random seed for deterministic dialog output choices",
-    )
-    args = parser.parse_args()
-
-    configure_dialog_engine(args.dialog_script, args.seed)
+    if args.watch_dialog > 0:
+        threading.Thread(target=dialog_watch_loop, args=(args.watch_dialog,), daemon=True).start()
     PORT = args.port
-    print(f"[FLASK] starting on 0.0.0.0:{PORT}")
-    print(f"[FLASK] open http://<robot-ip>:{PORT}/ from your laptop")
+    log.info("starting on 0.0.0.0:%d", PORT)
+    log.info("open http://<robot-ip>:%d/ from your laptop", PORT)
     app.run(host="0.0.0.0", port=PORT, debug=False, request_handler=QuietHandler)
@@ -0,0 +1,218 @@
+import functools
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import robot_log
+import trajectory
+from trajectory import Trajectory
+
+# Gesture library: gestures are defined in gestures.json and compiled once at
+# startup into a dispatch table, so a new <action> tag in a dialog script
+# only needs a new entry in the file. Servo frames are pre-encoded to the
+# Maestro's serial bytes; the cache is rebuilt when Robot.SERVO_NEUTRALS or
+# any servo range changes.
+#
+# Each gesture entry:
+#   cap        seconds before the gesture is abandoned (required)
+#   keyframes  joint -> [[t, value], ...]; value is a raw target or
+#              "neutral", "neutral+N", "neutral-N" (joint's SERVO_NEUTRALS)
+#   profile    "min_jerk" (default) or "linear"
+#   calls      [[t, method, *args], ...] RobotControl calls, e.g. wheels;
+#              wheel calls bypass the drive loop (direct=True): the timeline
+#              already times them, and the loop's slew limit and lease would
+#              reshape or cut short the move
+#   settle     seconds to wait for the servos to reach target afterwards
+#   on_cancel  "neutral": snap the gesture's joints to neutral if cut short
+#   on_exit    "stop": always call RobotControl.stop() afterwards
+#   groups     extra joint groups to reserve (see JOINT_GROUPS); the groups
+#              of the keyframed joints, and "wheels" if there are calls, are
+#              always included. Gestures with disjoint groups run in parallel.
+
+DEFAULT_GESTURE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gestures.json")
+
+log = robot_log.get("ACTION")
+
+NEUTRAL_RE = re.compile(r"^neutral\s*(?:([+-])\s*(\d+))?$")
+
+# RobotControl methods a gesture may call from its "calls" timeline.
+ALLOWED_CALLS = {"stop", "drive", "forward", "backward", "turn_left", "turn_right"}
+
+# Joint -> group, for deciding which gestures can share the robot.
+JOINT_GROUPS = {
+    "head_pan": "head",
+    "head_tilt": "head",
+    "waist": "waist",
+    "right_shoulder_ud": "right_arm",
+    "right_shoulder_yaw": "right_arm",
+    "right_elbow_ud": "right_arm",
+    "right_wrist_ud": "right_arm",
+    "right_wrist_rot": "right_arm",
+    "right_hand_pinch": "right_arm",
+    "left_shoulder_ud": "left_arm",
+    "left_shoulder_yaw": "left_arm",
+    "left_elbow_ud": "left_arm",
+    "left_wrist_ud": "left_arm",
+    "left_wrist_rot": "left_arm",
+    "left_hand_pinch": "left_arm",
+}
+GROUPS = frozenset(JOINT_GROUPS.values()) | {"wheels"}
+
+
+class Gesture:
+    def __init__(self, name, cap, timeline, settle=0.0, neutral_pose=None, stop_on_exit=False,
+                 groups=frozenset(), channels=()):
+        self.name = name
+        self.cap = cap
+        self.timeline = timeline
+        self.groups = groups
+        self.channels = channels
+        self.settle = settle
+        self.neutral_pose = neutral_pose
+        self.stop_on_exit = stop_on_exit
+
+    @property
+    def duration(self) -> float:
+        return self.timeline[-1][0] if self.timeline else 0.0
+
+    def play(self, cancel_event=None, deadline: Optional[float] = None, trace: Optional[list] = None) -> bool:
+        return trajectory.run_timeline(self.timeline, cancel_event=cancel_event, deadline=deadline, trace=trace)
+
+
+def _resolve_value(value, neutral: int, where: str) -> int:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        m = NEUTRAL_RE.match(value.strip())
+        if m:
+            sign, delta = m.groups()
+            if not sign:
+                return neutral
+            return neutral + int(delta) if sign == "+" else neutral - int(delta)
+    raise ValueError(f"{where}: bad target {value!r}")
+
+
+def _compile_gesture(name, spec, ctrl, rate_hz) -> Gesture:
+    robot = ctrl.robot
+    if not isinstance(spec, dict):
+        raise ValueError(f"gesture '{name}': expected an object")
+    try:
+        cap = float(spec["cap"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"gesture '{name}': missing or bad 'cap'")
+
+    keyframes: Dict[str, List[Tuple[float, int]]] = {}
+    channels: Dict[str, int] = {}
+    servos = {}
+    for joint, frames in spec.get("keyframes", {}).items():
+        servo = getattr(robot, joint, None)
+        if servo is None:
+            raise ValueError(f"gesture '{name}': {joint} servo is not configured")
+        neutral = robot.servo_neutral(joint)
+        keyframes[joint] = [
+            (float(t), _resolve_value(v, neutral, f"gesture '{name}' {joint}"))
+            for t, v in frames
+        ]
+        channels[joint] = servo.channel
+        servos[servo.channel] = servo
+
+    timeline = []
+    neutral_pose = {joint: robot.servo_neutral(joint) for joint in keyframes}
+    if keyframes:
+        traj = Trajectory(keyframes, profile=spec.get("profile", "min_jerk"))
+        # Precompiled, so every joint starts from its neutral rather than
+        # wherever it happens to be when the gesture is triggered.
+        for t, targets in traj.compile(channels, rate_hz=rate_hz, start=neutral_pose):
+            targets = {
+                ch: servos[ch].clamp(min(8000, max(2000, v))) for ch, v in targets.items()
+            }
+            timeline.append((t, ctrl.maestro.writeEncoded, ctrl.maestro.encodeTargets(targets)))
+
+    for entry in spec.get("calls", []):
+        t, method, args = float(entry[0]), entry[1], tuple(entry[2:])
+        if method not in ALLOWED_CALLS:
+            raise ValueError(f"gesture '{name}': call '{method}' is not allowed")
+        fn = getattr(ctrl, method)
+        if method != "stop":
+            fn = functools.partial(fn, direct=True)
+        timeline.append((t, fn, args))
+
+    # Stable sort keeps servo frames ahead of calls at the same instant.
+    timeline.sort(key=lambda entry: entry[0])
+
+    groups = set(spec.get("groups", []))
+    unknown = groups - GROUPS
+    if unknown:
+        raise ValueError(f"gesture '{name}': unknown groups {sorted(unknown)}")
+    groups.update(JOINT_GROUPS.get(joint, joint) for joint in keyframes)
+    if spec.get("calls") or spec.get("on_exit") == "stop":
+        groups.add("wheels")
+    return Gesture(
+        name,
+        cap,
+        timeline,
+        settle=float(spec.get("settle", 0.0)),
+        neutral_pose=neutral_pose if spec.get("on_cancel") == "neutral" else None,
+        stop_on_exit=spec.get("on_exit") == "stop",
+        groups=frozenset(groups),
+        channels=tuple(sorted(servos)),
+    )
+
+
+def _calibration(ctrl) -> tuple:
+    # Everything a compiled gesture depends on besides the file itself.
+    robot = ctrl.robot
+    ranges = tuple(
+        (servo.channel, servo.min, servo.max)
+        for servo in vars(robot).values()
+        if hasattr(servo, "channel") and hasattr(servo, "clamp")
+    )
+    return (
+        tuple(sorted(robot.SERVO_NEUTRALS.items())),
+        ranges,
+        tuple(ctrl.maestro.Mins),
+        tuple(ctrl.maestro.Maxs),
+    )
+
+
+class GestureLibrary:
+    """
+    Gesture specs from a file, compiled against ctrl and cached. get() checks
+    the calibration (neutrals and ranges) and recompiles everything if it
+    changed since the last compile.
+    """
+
+    def __init__(self, ctrl, path: str = DEFAULT_GESTURE_FILE, rate_hz: float = trajectory.DEFAULT_RATE_HZ):
+        self.ctrl = ctrl
+        self.path = path
+        self.rate_hz = rate_hz
+        with open(path, "r", encoding="utf-8") as f:
+            self.specs = json.load(f)
+        self._compiled: Dict[str, Gesture] = {}
+        self._calibration = None
+        self.compile()
+        log.info("loaded %d gestures from %s", len(self._compiled), path)
+
+    def compile(self) -> None:
+        """
+        Compile every gesture now. Raises ValueError on the first bad one.
+        """
+        calibration = _calibration(self.ctrl)
+        self._compiled = {
+            name: _compile_gesture(name, spec, self.ctrl, self.rate_hz)
+            for name, spec in self.specs.items()
+        }
+        self._calibration = calibration
+
+    def get(self, name: str) -> Optional[Gesture]:
+        if _calibration(self.ctrl) != self._calibration:
+            log.info("servo calibration changed, recompiling gestures")
+            self.compile()
+        return self._compiled.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.specs
+
+    def __len__(self) -> int:
+        return len(self.specs)
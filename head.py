@@ -1,5 +1,9 @@
+import robot_log
 from motor import Motor
 
+init_log = robot_log.get("INIT")
+log = robot_log.get("HEAD")
+
 
 class Head:
     """
@@ -12,7 +16,7 @@ class Head:
     """
 
     def __init__(self, maestro, channel_map=None):
-        print("[INIT] Head subsystem initializing")
+        init_log.info("Head subsystem initializing")
 
         # Default channel assignments (CHANGE if your wiring differs)
         default_map = {
@@ -25,10 +29,10 @@ class Head:
         # Create Motor objects for each head motor
         self.motors = {}
         for name, ch in self.channel_map.items():
-            print(f"[INIT] Head motor '{name}' on channel {ch}")
+            init_log.info("Head motor '%s' on channel %d", name, ch)
             self.motors[name] = Motor(maestro, ch)
 
-        print("[INIT] Head subsystem ready")
+        init_log.info("Head subsystem ready")
 
     def set_motor_speed(self, motor_name, speed):
         """
@@ -37,31 +41,31 @@ class Head:
         Keep it reasonable (e.g., 0-200) unless you know your controller range.
         """
         if motor_name not in self.motors:
-            print(f"[HEAD ERROR] Motor '{motor_name}' not found. Valid: {list(self.motors.keys())}")
+            log.error("Motor '%s' not found. Valid: %s", motor_name, list(self.motors.keys()))
             return
 
         m = self.motors[motor_name]
 
         # Clamp to a reasonable range to avoid crazy values
         if speed > 200:
-            print(f"[HEAD WARN] speed {speed} too high, clamping to 200")
+            log.warning("speed %s too high, clamping to 200", speed)
             speed = 200
         elif speed < -200:
-            print(f"[HEAD WARN] speed {speed} too low, clamping to -200")
+            log.warning("speed %s too low, clamping to -200", speed)
             speed = -200
 
         if speed == 0:
-            print(f"[HEAD] {motor_name}: STOP")
+            log.info("%s: STOP", motor_name)
             m.stop_motor()
         elif speed > 0:
-            print(f"[HEAD] {motor_name}: FORWARD speed={speed}")
+            log.info("%s: FORWARD speed=%s", motor_name, speed)
             m.forward(speed)
         else:
-            print(f"[HEAD] {motor_name}: BACKWARD speed={abs(speed)}")
+            log.info("%s: BACKWARD speed=%s", motor_name, abs(speed))
             m.backward(abs(speed))
 
     def stop_all(self):
-        print("[HEAD] STOP ALL")
+        log.info("STOP ALL")
         for name, m in self.motors.items():
-            print(f"[HEAD] stopping {name}")
+            log.info("stopping %s", name)
             m.stop_motor()
@@ -1,8 +1,57 @@
 import serial
+import queue
+import struct
+import threading
+import time
+from concurrent.futures import Future
 from sys import version_info
 
+import robot_log
+
 PY2 = version_info[0] == 2   #Running Python 2.x?
 
+log = robot_log.get("MAESTRO")
+
+# Lead-in, device, command, channel, value lsb, value msb -- the layout of the
+# set target/speed/acceleration commands. One pack() builds the whole frame.
+CMD_CHAN_VALUE = struct.Struct('6B')
+
+# Serial writer thread priorities (lower runs first). See Controller.startWriter().
+PRIO_URGENT = 0     # stops / neutral: jump the queue, never dropped
+PRIO_NORMAL = 1     # poses, speeds, queries
+PRIO_SHUTDOWN = 2   # sentinel that ends the writer after everything queued
+
+# Already-completed Future handed back by _submit() when there is no writer
+# thread and the bytes went out synchronously.
+_DONE = Future()
+_DONE.set_result(b'')
+
+_NO_CHANS = frozenset()
+
+
+# One queued serial transaction for the writer thread. reply > 0 means read that
+# many bytes after writing and hand them to future. Plain writes carry no
+# future; only callers that hand one back (queries, forceTargets) attach one.
+# Target writes carry their sorted (chan, target) pairs in targets, and chans
+# is the set of those channels (precomputed by encodeTargets callers).
+class _SerialJob:
+    __slots__ = ("priority", "seq", "data", "reply", "future", "targets", "chans", "dead")
+
+    def __init__(self, priority, seq, data, reply=0, targets=None, chans=None, future=None):
+        self.priority = priority
+        self.seq = seq
+        self.data = data
+        self.reply = reply
+        self.future = future
+        self.targets = targets
+        if chans is None:
+            chans = frozenset(chan for chan, _ in targets) if targets else _NO_CHANS
+        self.chans = chans
+        self.dead = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
 #
 #---------------------------
 # Maestro Servo Controller
@@ -28,11 +77,21 @@ class Controller:
     # assumes.  If two or more controllers are connected to different serial
     # ports, or you are using a Windows OS, you can provide the tty port.  For
     # example, '/dev/ttyACM2' or for Windows, something like 'COM3'.
-    def __init__(self,ttyStr='/dev/ttyACM0',device=0x0c):
+    # An already-open serial-like object (anything with write/read/close) can be
+    # passed as usb instead, e.g. a fake port for benchmarks. ttyStr='sim' uses
+    # the in-process simulator from maestro_sim instead of real hardware.
+    # timeout (seconds) bounds each read of a query reply, so an unplugged or
+    # wedged controller fails the query instead of hanging the caller.
+    def __init__(self,ttyStr='/dev/ttyACM0',device=0x0c,usb=None,timeout=0.5):
         # Open the command port
-        self.usb = serial.Serial(ttyStr)
+        if usb is None and ttyStr == 'sim':
+            from maestro_sim import SimulatedSerial
+            usb = SimulatedSerial(device)
+        self.usb = usb if usb is not None else serial.Serial(ttyStr, timeout=timeout)
         # Command lead-in and device number are sent for each Pololu serial command.
+        self.device = device
         self.PololuCmd = chr(0xaa) + chr(device)
+        self.PololuBytes = bytes((0xaa, device))
         # Track target position for each servo. The function isMoving() will
         # use the Target vs Current servo position to determine if movement is
         # occuring.  Upto 24 servos on a Maestro, (0-23). Targets start at 0.
@@ -40,18 +99,240 @@ class Controller:
         # Servo minimum and maximum targets can be restricted to protect components.
         self.Mins = [0] * 24
         self.Maxs = [0] * 24
+        # Last value actually written per channel (None = never written), and
+        # write counters. See setCoalescing().
+        self.Sent = [None] * 24
+        self.writesIssued = 0
+        self.writesSuppressed = 0
+        self.coalesce = False
+        self.coalesceWindow = 0.0
+        self._pending = {}
+        self._pendingEvent = threading.Event()
+        self._flusher = None
+        # Serializes target writes with the coalescing state above.
+        self._writeLock = threading.RLock()
+        # Optional serial writer thread; None means callers write synchronously.
+        self._writer = None
+        self._queue = None
+        self._maxQueue = 0
+        self._seq = 0
+        # Latest {chan: target} held back while the queue is full. Guarded by
+        # the queue's mutex; see _enqueue().
+        self._overflow = {}
+        self.writesDropped = 0
+        self.writesMerged = 0
+        self.writeErrors = 0
         
     # Cleanup by closing USB serial port
     def close(self):
+        self.stopWriter()
         self.usb.close()
 
-    # Send a Pololu command out the serial port
+    # Move all serial I/O onto one writer thread fed by a priority queue.
+    # Writes then return as soon as they are queued. Urgent writes (setTarget
+    # with force=True) run before queued normal ones and cancel queued normal
+    # writes to the same channels, so a stale pose can't follow a stop. Once
+    # maxQueue jobs are queued, target writes are never dropped: a write
+    # overwrites the bytes of the last queued write to exactly the same
+    # channels in place, or its values go into a per-channel latest-value
+    # slot that the writer sends once no queued write touches those channels
+    # (the queue does not grow either way). Targets replaced by a newer value
+    # before reaching the wire count in writesMerged. Other writes (speed,
+    # accel, raw commands) are dropped when full and count in writesDropped.
+    # Queries (getPosition etc.) are never dropped.
+    def startWriter(self, maxQueue=256):
+        if self._writer is not None:
+            return
+        self._queue = queue.PriorityQueue()
+        self._maxQueue = maxQueue
+        self._writer = threading.Thread(target=self._writerLoop, daemon=True)
+        self._writer.start()
+
+    # Drain anything already queued, then stop the writer thread.
+    def stopWriter(self):
+        writer = self._writer
+        if writer is None:
+            return
+        self._queue.put(_SerialJob(PRIO_SHUTDOWN, self._nextSeq(), None))
+        writer.join(timeout=2.0)
+        self._writer = None
+
+    def _nextSeq(self):
+        with self._writeLock:
+            self._seq += 1
+            return self._seq
+
+    def _writerLoop(self):
+        while True:
+            self._drainOverflow()
+            job = self._queue.get()
+            if job.data is None:
+                self._drainOverflow(final=True)
+                return
+            if job.dead:
+                continue
+            try:
+                self.usb.write(job.data)
+                reply = self._readReply(job.reply) if job.reply else b''
+                if job.future is not None:
+                    job.future.set_result(reply)
+            except Exception as ex:
+                self.writeErrors += 1
+                log.error("serial I/O failed: %s", ex)
+                if job.future is not None:
+                    job.future.set_exception(ex)
+
+    # Read exactly nbytes of reply. A short read (the port timed out) raises
+    # after discarding whatever did arrive, so a late reply can't be taken
+    # as the answer to the next query.
+    def _readReply(self, nbytes):
+        reply = self.usb.read(nbytes)
+        if len(reply) < nbytes:
+            reset = getattr(self.usb, 'reset_input_buffer', None)
+            if reset is not None:
+                reset()
+            raise IOError("short reply from Maestro: %d of %d bytes" % (len(reply), nbytes))
+        return reply
+
+    # Write the latest-value slots (see _enqueue()) for channels no live
+    # queued write still touches; those stay until the writes ahead of them
+    # have gone out. final=True writes all of them (writer shutdown).
+    def _drainOverflow(self, final=False):
+        with self._queue.mutex:
+            if not self._overflow:
+                return
+            busy = set()
+            if not final:
+                for other in self._queue.queue:
+                    if not other.dead:
+                        busy.update(other.chans)
+            ready = sorted((chan, target) for chan, target in self._overflow.items() if chan not in busy)
+            for chan, _ in ready:
+                del self._overflow[chan]
+        if not ready:
+            return
+        try:
+            self.usb.write(self._packTargets(ready))
+        except Exception as ex:
+            self.writeErrors += 1
+            log.error("serial I/O failed: %s", ex)
+
+    # Send raw bytes. Returns False if the command was dropped (queue full).
+    # targets: the (chan, target) pairs a target write carries, see _SerialJob.
+    def _write(self, data, urgent=False, targets=None, chans=None):
+        if self._writer is None:
+            self.usb.write(data)
+            return True
+        job = _SerialJob(PRIO_URGENT if urgent else PRIO_NORMAL, self._nextSeq(), data,
+                         targets=targets, chans=chans)
+        return self._enqueue(job)
+
+    # _write, returning a Future that completes once the bytes are on the
+    # wire (already done without a writer thread), or None if dropped.
+    def _submit(self, data, urgent=False, targets=None, chans=None):
+        if self._writer is None:
+            self.usb.write(data)
+            return _DONE
+        job = _SerialJob(PRIO_URGENT if urgent else PRIO_NORMAL, self._nextSeq(), data,
+                         targets=targets, chans=chans, future=Future())
+        return job.future if self._enqueue(job) else None
+
+    # Queue a write job, applying the urgent-cancel and full-queue rules
+    # described at startWriter(). Returns False if the job was dropped.
+    #
+    # Invariant: a channel in _overflow holds a newer target than any live
+    # queued write to it, so a write touching an overflowed channel goes to
+    # the overflow as well, and the writer only drains a channel once no
+    # live queued write touches it.
+    def _enqueue(self, job):
+        with self._queue.mutex:
+            if job.priority == PRIO_URGENT:
+                for chan in job.chans:
+                    if self._overflow.pop(chan, None) is not None:
+                        self.writesMerged += 1
+                for other in self._queue.queue:
+                    if other.priority == PRIO_NORMAL and not other.dead and other.chans & job.chans:
+                        other.dead = True
+                        self._rescueTargets(other, job.chans)
+            elif job.targets is not None and job.future is None:
+                overflowed = not job.chans.isdisjoint(self._overflow)
+                if overflowed or len(self._queue.queue) >= self._maxQueue:
+                    # Full (dead jobs still count), or the overflow already
+                    # has newer values for some of these channels.
+                    if not overflowed:
+                        # Nothing queued after the last write touching these
+                        # channels touches them, so overwriting it in place
+                        # keeps the order.
+                        stale = max(
+                            (o for o in self._queue.queue
+                             if o.priority == PRIO_NORMAL and not o.dead and o.chans & job.chans),
+                            default=None,
+                        )
+                        if stale is not None and stale.chans == job.chans and stale.future is None:
+                            stale.data = job.data
+                            stale.targets = job.targets
+                            self.writesMerged += len(job.targets)
+                            return True
+                    for chan, target in job.targets:
+                        if chan in self._overflow:
+                            self.writesMerged += 1
+                        self._overflow[chan] = target
+                    return True
+            elif len(self._queue.queue) >= self._maxQueue:
+                # Nothing to keep a latest value of (or the caller waits on
+                # this exact job): drop it.
+                self.writesDropped += 1
+                return False
+        self._queue.put(job)
+        return True
+
+    # An urgent write cancelled dead; the targets it carried for channels
+    # outside chans (the urgent write's) must still go out, so move them to
+    # the overflow unless a newer value for the channel is already queued
+    # or held there. Caller holds the queue mutex.
+    def _rescueTargets(self, dead, chans):
+        if not dead.targets:
+            self.writesDropped += 1
+            return
+        for chan, target in dead.targets:
+            if chan in chans:
+                self.writesMerged += 1
+            elif chan not in self._overflow and not any(
+                    o.seq > dead.seq and not o.dead and chan in o.chans for o in self._queue.queue):
+                self._overflow[chan] = target
+
+    # Send a command that answers with nbytes; returns a Future of the reply
+    # bytes, failed with IOError if the reply is short (port timeout).
+    def _query(self, data, nbytes):
+        if self._writer is None:
+            fut = Future()
+            self.usb.write(data)
+            try:
+                fut.set_result(self._readReply(nbytes))
+            except Exception as ex:
+                self.writeErrors += 1
+                fut.set_exception(ex)
+            return fut
+        job = _SerialJob(PRIO_NORMAL, self._nextSeq(), data, reply=nbytes, future=Future())
+        self._queue.put(job)
+        return job.future
+
+    # Send a Pololu command out the serial port.
+    # cmd may be pre-encoded bytes (preferred) or a legacy chr() string.
     def sendCmd(self, cmd):
+        if isinstance(cmd, (bytes, bytearray)):
+            self._write(self.PololuBytes + cmd)
+            return
         cmdStr = self.PololuCmd + cmd
         if PY2:
-            self.usb.write(cmdStr)
+            self._write(cmdStr)
         else:
-            self.usb.write(bytes(cmdStr,'latin-1'))
+            self._write(bytes(cmdStr,'latin-1'))
+
+    # Encode a complete channel/value command frame, lead-in included.
+    # Values are split into two 7-bit bytes as the Pololu protocol requires.
+    def encodeChanValue(self, cmd, chan, value):
+        return CMD_CHAN_VALUE.pack(0xaa, self.device, cmd, chan, value & 0x7f, (value >> 7) & 0x7f)
 
     # Set channels min and max value range.  Use this as a safety to protect
     # from accidentally moving outside known safe parameters. A setting of 0
@@ -79,41 +360,210 @@ class Controller:
     # Servo center is at 1500 microseconds, or 6000 quarter-microseconds
     # Typcially valid servo range is 3000 to 9000 quarter-microseconds
     # If channel is configured for digital output, values < 6000 = Low ouput
-    def setTarget(self, chan, target):
+    # force=True always writes immediately, bypassing coalescing (safety stops).
+    def setTarget(self, chan, target, force=False):
         # if Min is defined and Target is below, force to Min
         if self.Mins[chan] > 0 and target < self.Mins[chan]:
             target = self.Mins[chan]
         # if Max is defined and Target is above, force to Max
         if self.Maxs[chan] > 0 and target > self.Maxs[chan]:
             target = self.Maxs[chan]
-        #    
-        lsb = target & 0x7f #7 bits for least significant byte
-        msb = (target >> 7) & 0x7f #shift 7 and take next 7 bits for msb
-        cmd = chr(0x04) + chr(chan) + chr(lsb) + chr(msb)
-        self.sendCmd(cmd)
-        # Record Target value
-        self.Targets[chan] = target
-        
+        # Coalescing off (the default): nothing is pending, so skip the lock
+        # and the pending map and just write and record.
+        if not self.coalesce:
+            if self._write(self.encodeChanValue(0x04, chan, target), urgent=force, targets=((chan, target),)):
+                self.Targets[chan] = target
+                self.Sent[chan] = target
+                self.writesIssued += 1
+            return
+        with self._writeLock:
+            if self.coalesce and not force:
+                if chan not in self._pending and self.Sent[chan] == target:
+                    self.Targets[chan] = target
+                    self.writesSuppressed += 1
+                    return
+                if self.coalesceWindow > 0:
+                    if chan in self._pending:
+                        self.writesSuppressed += 1
+                    self.Targets[chan] = target
+                    self._pending[chan] = target
+                    self._pendingEvent.set()
+                    return
+            self._pending.pop(chan, None)
+            if self._write(self.encodeChanValue(0x04, chan, target), urgent=force, targets=((chan, target),)):
+                # Record Target value
+                self.Targets[chan] = target
+                self.Sent[chan] = target
+                self.writesIssued += 1
+
+    # Set several channels at once from a {chan: target} dict, e.g. a full pose.
+    # Min/Max constraints apply per channel as in setTarget. Runs of contiguous
+    # channels are packed into the Maestro "Set Multiple Targets" command (0x1F),
+    # and every frame goes out in a single write so the joints start together.
+    # Not available with Micro Maestro.
+    def setTargets(self, targets):
+        if not targets:
+            return
+        clamped = []
+        for chan in sorted(targets):
+            target = targets[chan]
+            if self.Mins[chan] > 0 and target < self.Mins[chan]:
+                target = self.Mins[chan]
+            if self.Maxs[chan] > 0 and target > self.Maxs[chan]:
+                target = self.Maxs[chan]
+            clamped.append((chan, target))
+        with self._writeLock:
+            for chan, _ in clamped:
+                self._pending.pop(chan, None)
+            if self.coalesce:
+                kept = []
+                for chan, target in clamped:
+                    if self.Sent[chan] != target:
+                        kept.append((chan, target))
+                    else:
+                        self.Targets[chan] = target
+                self.writesSuppressed += len(clamped) - len(kept)
+                clamped = kept
+            self._writeTargets(clamped)
+
+    # Write already-clamped (chan, target) pairs, sorted by channel, as one
+    # frame, and record them once the write is accepted. Caller holds _writeLock.
+    def _writeTargets(self, clamped):
+        if not clamped:
+            return
+        if not self._write(self._packTargets(clamped), targets=tuple(clamped)):
+            return
+        for chan, target in clamped:
+            self.Targets[chan] = target
+            self.Sent[chan] = target
+        self.writesIssued += len(clamped)
+
+    # Encode sorted, clamped (chan, target) pairs into one frame of bytes.
+    def _packTargets(self, clamped):
+        frame = bytearray()
+        start = 0
+        for i in range(1, len(clamped) + 1):
+            if i == len(clamped) or clamped[i][0] != clamped[i - 1][0] + 1:
+                self._packTargetRun(frame, clamped[start:i])
+                start = i
+        return bytes(frame)
+
+    # Emergency path: send {chan: target} as one urgent frame that runs ahead
+    # of every queued write (and cancels queued normal writes to the same
+    # channels), skipping coalescing. Returns a Future that completes when
+    # the bytes have been written, for measuring stop latency.
+    def forceTargets(self, targets):
+        frame, clamped, chans = self.encodeTargets(targets)
+        with self._writeLock:
+            for chan, _ in clamped:
+                self._pending.pop(chan, None)
+            # Urgent writes are never dropped.
+            fut = self._submit(frame, urgent=True, targets=clamped, chans=chans)
+            for chan, target in clamped:
+                self.Targets[chan] = target
+                self.Sent[chan] = target
+            self.writesIssued += len(clamped)
+        return fut
+
+    # Pre-encode a {chan: target} dict for later writeEncoded() calls.
+    # Returns (frame bytes, clamped (chan, target) tuple, channel frozenset).
+    # The result depends on setRange() limits; re-encode if they change.
+    def encodeTargets(self, targets):
+        clamped = []
+        for chan in sorted(targets):
+            target = targets[chan]
+            if self.Mins[chan] > 0 and target < self.Mins[chan]:
+                target = self.Mins[chan]
+            if self.Maxs[chan] > 0 and target > self.Maxs[chan]:
+                target = self.Maxs[chan]
+            clamped.append((chan, target))
+        return self._packTargets(clamped), tuple(clamped), frozenset(chan for chan, _ in clamped)
+
+    # Send a frame from encodeTargets() as is. No clamping, encoding or
+    # coalescing on this path; it only writes and records Targets/Sent.
+    def writeEncoded(self, frame, clamped, chans):
+        with self._writeLock:
+            for chan, _ in clamped:
+                self._pending.pop(chan, None)
+            if not self._write(frame, targets=clamped, chans=chans):
+                return
+            for chan, target in clamped:
+                self.Targets[chan] = target
+                self.Sent[chan] = target
+            self.writesIssued += len(clamped)
+
+    # Append one run of contiguous (chan, target) pairs to frame.
+    def _packTargetRun(self, frame, run):
+        if len(run) == 1:
+            chan, target = run[0]
+            frame += self.encodeChanValue(0x04, chan, target)
+        else:
+            frame += self.PololuBytes
+            frame += bytes((0x1f, len(run), run[0][0]))
+            for _, target in run:
+                frame += bytes((target & 0x7f, (target >> 7) & 0x7f))
+
+    # Optional write coalescing for high-rate callers (joystick loop, watchdog).
+    # When enabled, setTarget/setTargets skip channels whose value is already
+    # on the wire. With windowS > 0, setTarget updates are also held for up to
+    # windowS (e.g. one 20ms servo tick) and only the latest value per channel
+    # is sent, batched into one write. setTarget(force=True) and flush() bypass
+    # the window for safety stops. Counters: writesIssued / writesSuppressed.
+    def setCoalescing(self, enabled, windowS=0.0):
+        with self._writeLock:
+            self.coalesce = enabled
+            self.coalesceWindow = windowS if enabled else 0.0
+        if not enabled or windowS <= 0:
+            self.flush()
+        elif self._flusher is None:
+            self._flusher = threading.Thread(target=self._flushLoop, daemon=True)
+            self._flusher.start()
+
+    # Immediately write any held coalesced targets.
+    def flush(self):
+        with self._writeLock:
+            pending = sorted(self._pending.items())
+            self._pending.clear()
+            self._pendingEvent.clear()
+            kept = [(chan, target) for chan, target in pending if self.Sent[chan] != target]
+            self.writesSuppressed += len(pending) - len(kept)
+            self._writeTargets(kept)
+
+    def _flushLoop(self):
+        while True:
+            self._pendingEvent.wait()
+            time.sleep(self.coalesceWindow)
+            self.flush()
+
+    # Counters for writes put on the wire vs. dropped by coalescing, and for
+    # the writer queue (see startWriter()).
+    def getWriteStats(self):
+        with self._writeLock:
+            return {
+                "issued": self.writesIssued,
+                "suppressed": self.writesSuppressed,
+                "pending": len(self._pending),
+                "merged": self.writesMerged,
+                "dropped": self.writesDropped,
+                "errors": self.writeErrors,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "overflow": len(self._overflow),
+            }
+
     # Set speed of channel
     # Speed is measured as 0.25microseconds/10milliseconds
     # For the standard 1ms pulse width change to move a servo between extremes, a speed
     # of 1 will take 1 minute, and a speed of 60 would take 1 second.
     # Speed of 0 is unrestricted.
     def setSpeed(self, chan, speed):
-        lsb = speed & 0x7f #7 bits for least significant byte
-        msb = (speed >> 7) & 0x7f #shift 7 and take next 7 bits for msb
-        cmd = chr(0x07) + chr(chan) + chr(lsb) + chr(msb)
-        self.sendCmd(cmd)
+        self._write(self.encodeChanValue(0x07, chan, speed))
 
     # Set acceleration of channel
     # This provide soft starts and finishes when servo moves to target position.
     # Valid values are from 0 to 255. 0=unrestricted, 1 is slowest start.
     # A value of 1 will take the servo about 3s to move between 1ms to 2ms range.
     def setAccel(self, chan, accel):
-        lsb = accel & 0x7f #7 bits for least significant byte
-        msb = (accel >> 7) & 0x7f #shift 7 and take next 7 bits for msb
-        cmd = chr(0x09) + chr(chan) + chr(lsb) + chr(msb)
-        self.sendCmd(cmd)
+        self._write(self.encodeChanValue(0x09, chan, accel))
     
     # Get the current position of the device on the specified channel
     # The result is returned in a measure of quarter-microseconds, which mirrors
@@ -123,11 +573,31 @@ class Controller:
     # the position result will align well with the acutal servo position, assuming
     # it is not stalled or slowed.
     def getPosition(self, chan):
-        cmd = chr(0x10) + chr(chan)
-        self.sendCmd(cmd)
-        lsb = ord(self.usb.read())
-        msb = ord(self.usb.read())
-        return (msb << 8) + lsb
+        reply = self.getPositionAsync(chan).result()
+        return (reply[1] << 8) + reply[0]
+
+    # Non-blocking getPosition: a Future resolving to the raw 2-byte reply
+    # (lsb, msb). With the writer thread running this never waits on the port.
+    def getPositionAsync(self, chan):
+        return self._query(self.PololuBytes + bytes((0x10, chan)), 2)
+
+    # Read several channels in one round trip: all 0x10 requests go out in a
+    # single write and the 2-byte replies come back in one read(2*n).
+    # Returns {chan: position}. timeout (seconds) bounds the wait for the
+    # reply; concurrent.futures.TimeoutError is raised past it.
+    def getPositions(self, channels, timeout=None):
+        channels = list(channels)
+        if not channels:
+            return {}
+        request = bytearray()
+        for chan in channels:
+            request += self.PololuBytes
+            request += bytes((0x10, chan))
+        reply = self._query(bytes(request), 2 * len(channels)).result(timeout=timeout)
+        return {
+            chan: (reply[2 * i + 1] << 8) + reply[2 * i]
+            for i, chan in enumerate(channels)
+        }
 
     # Test to see if a servo has reached the set target position.  This only provides
     # useful results if the Speed parameter is set slower than the maximum speed of
@@ -142,28 +612,60 @@ class Controller:
                 return True
         return False
     
+    # isMoving for several channels with one getPositions round trip.
+    # Returns the channels still moving. timeout as for getPositions.
+    def getMovingChannels(self, channels, timeout=None):
+        channels = [chan for chan in channels if self.Targets[chan] > 0]
+        positions = self.getPositions(channels, timeout=timeout)
+        return [chan for chan in channels if positions[chan] != self.Targets[chan]]
+
     # Have all servo outputs reached their targets? This is useful only if Speed and/or
     # Acceleration have been set on one or more of the channels. Returns True or False.
     # Not available with Micro Maestro.
     def getMovingState(self):
-        cmd = chr(0x13)
-        self.sendCmd(cmd)
-        if self.usb.read() == chr(0):
+        reply = self._query(self.PololuBytes + b'\x13', 1).result()
+        if reply == b'\x00':
             return False
         else:
             return True
 
+    # Poll getMovingState every pollS until all servos have reached their
+    # targets. Returns True once settled, False on timeout or when cancelEvent
+    # (a threading.Event) is set. A reply that doesn't arrive within pollS
+    # counts as still moving rather than blocking the caller. With channels,
+    # only those are checked (getMovingChannels), so other servos may still
+    # be moving.
+    def waitUntilSettled(self, timeout=2.0, pollS=0.02, cancelEvent=None, channels=None):
+        end = time.monotonic() + timeout
+        while True:
+            if cancelEvent is not None and cancelEvent.is_set():
+                return False
+            try:
+                if channels is not None:
+                    if not self.getMovingChannels(channels, timeout=pollS):
+                        return True
+                elif self._query(self.PololuBytes + b'\x13', 1).result(timeout=pollS) == b'\x00':
+                    return True
+            except Exception:
+                pass
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return False
+            if cancelEvent is not None:
+                cancelEvent.wait(min(pollS, remaining))
+            else:
+                time.sleep(min(pollS, remaining))
+
     # Run a Maestro Script subroutine in the currently active script. Scripts can
     # have multiple subroutines, which get numbered sequentially from 0 on up. Code your
     # Maestro subroutine to either infinitely loop, or just end (return is not valid).
     def runScriptSub(self, subNumber):
-        cmd = chr(0x27) + chr(subNumber)
+        cmd = bytes((0x27, subNumber))
         # can pass a param with command 0x28
-        # cmd = chr(0x28) + chr(subNumber) + chr(lsb) + chr(msb)
+        # cmd = bytes((0x28, subNumber, lsb, msb))
         self.sendCmd(cmd)
 
     # Stop the current Maestro Script
     def stopScript(self):
-        cmd = chr(0x24)
-        self.sendCmd(cmd)
+        self.sendCmd(b'\x24')
 
@@ -0,0 +1,188 @@
+import threading
+import time
+
+#
+#---------------------------
+# Simulated Maestro
+#---------------------------
+#
+# In-process stand-in for the Maestro's command port. It accepts the same
+# bytes maestro.Controller writes (Pololu and compact protocol), models servo
+# travel under the per-channel speed and acceleration limits, and answers
+# position / moving-state queries. Use it as Controller(usb=SimulatedSerial())
+# or Controller('sim').
+#
+# Units follow the Maestro: targets in quarter-microseconds, speed in
+# 0.25us per 10ms, acceleration in 0.25us per 10ms per 80ms. The simulation
+# advances in 10ms ticks, lazily, whenever the port is written or read.
+
+TICK_S = 0.01
+CHANNELS = 24
+
+# Data bytes that follow each command byte (0x1F is variable, handled apart).
+CMD_LENGTHS = {
+    0x04: 3,  # set target: chan, lsb, msb
+    0x07: 3,  # set speed
+    0x09: 3,  # set acceleration
+    0x10: 1,  # get position: chan
+    0x13: 0,  # get moving state
+    0x21: 0,  # get errors
+    0x22: 0,  # go home
+    0x24: 0,  # stop script
+    0x27: 1,  # restart script at subroutine
+    0x28: 3,  # restart script at subroutine with parameter
+    0x2E: 0,  # get script status
+}
+
+
+class SimulatedSerial:
+    def __init__(self, device=0x0c, clock=time.monotonic):
+        self.device = device
+        self.clock = clock
+        self.targets = [0] * CHANNELS
+        self.positions = [0.0] * CHANNELS
+        self.velocities = [0.0] * CHANNELS
+        self.speeds = [0] * CHANNELS
+        self.accels = [0] * CHANNELS
+        self.commands = 0
+        self.bytes_written = 0
+        self._rx = bytearray()
+        self._tx = bytearray()
+        self._last_tick = clock()
+        self._lock = threading.Lock()
+        self.is_open = True
+
+    # -------- serial.Serial surface --------
+
+    def write(self, data):
+        with self._lock:
+            self._advance()
+            self._rx += data
+            self.bytes_written += len(data)
+            self._parse()
+        return len(data)
+
+    def read(self, size=1):
+        # Replies are produced as soon as a query is parsed, so there is never
+        # anything to wait for; a short read behaves like a serial timeout.
+        with self._lock:
+            out = bytes(self._tx[:size])
+            del self._tx[:size]
+        return out
+
+    @property
+    def in_waiting(self):
+        with self._lock:
+            return len(self._tx)
+
+    def close(self):
+        self.is_open = False
+
+    # -------- protocol --------
+
+    def _parse(self):
+        buf = self._rx
+        while buf:
+            if buf[0] == 0xAA:
+                # Pololu protocol: 0xAA, device, command with bit 7 clear.
+                if len(buf) < 3:
+                    return
+                device, cmd, start = buf[1], buf[2], 3
+            elif buf[0] & 0x80:
+                # Compact protocol: command with bit 7 set, no device byte.
+                device, cmd, start = self.device, buf[0] & 0x7F, 1
+            else:
+                del buf[0]  # stray data byte; resync on the next command
+                continue
+
+            if cmd == 0x1F:
+                if len(buf) < start + 2:
+                    return
+                length = 2 + 2 * buf[start]
+            elif cmd in CMD_LENGTHS:
+                length = CMD_LENGTHS[cmd]
+            else:
+                del buf[:start]  # unknown command, skip it
+                continue
+            if len(buf) < start + length:
+                return
+            args = bytes(buf[start:start + length])
+            del buf[:start + length]
+            if device == self.device:
+                self.commands += 1
+                self._execute(cmd, args)
+
+    def _execute(self, cmd, args):
+        if cmd == 0x04:
+            chan = args[0]
+            self.targets[chan] = args[1] | (args[2] << 7)
+            self._settle_if_unlimited(chan)
+        elif cmd == 0x07:
+            self.speeds[args[0]] = args[1] | (args[2] << 7)
+        elif cmd == 0x09:
+            self.accels[args[0]] = args[1] | (args[2] << 7)
+        elif cmd == 0x1F:
+            count, first = args[0], args[1]
+            for i in range(count):
+                chan = first + i
+                self.targets[chan] = args[2 + 2 * i] | (args[3 + 2 * i] << 7)
+                self._settle_if_unlimited(chan)
+        elif cmd == 0x10:
+            pos = int(round(self.positions[args[0]]))
+            self._tx += bytes((pos & 0xFF, (pos >> 8) & 0xFF))
+        elif cmd == 0x13:
+            self._tx += b"\x01" if self._any_moving() else b"\x00"
+        elif cmd == 0x21:
+            self._tx += b"\x00\x00"
+        elif cmd == 0x2E:
+            self._tx += b"\x01"  # no script running
+
+    # -------- motion model --------
+
+    def _settle_if_unlimited(self, chan):
+        # Speed and acceleration both 0 mean no limit: the pulse width jumps
+        # straight to target. With only speed 0 the acceleration still ramps
+        # the move (see _step). A channel that has never had a target also
+        # starts at its first one.
+        if (self.speeds[chan] == 0 and self.accels[chan] == 0) or self.positions[chan] == 0:
+            self.positions[chan] = float(self.targets[chan])
+            self.velocities[chan] = 0.0
+
+    def _any_moving(self):
+        return any(
+            self.targets[c] and self.positions[c] != self.targets[c]
+            for c in range(CHANNELS)
+        )
+
+    def _advance(self):
+        now = self.clock()
+        ticks = int((now - self._last_tick) / TICK_S)
+        if ticks <= 0:
+            return
+        self._last_tick += ticks * TICK_S
+        for chan in range(CHANNELS):
+            if self.targets[chan] and self.positions[chan] != self.targets[chan]:
+                self._step(chan, ticks)
+
+    def _step(self, chan, ticks):
+        target = float(self.targets[chan])
+        pos = self.positions[chan]
+        vel = self.velocities[chan]  # unsigned, units per tick
+        # Speed 0 is no cap, also when set mid-move.
+        vmax = float(self.speeds[chan]) if self.speeds[chan] else float("inf")
+        # accel units are per 80ms; per 10ms tick that is accel / 8.
+        accel = self.accels[chan] / 8.0
+        for _ in range(ticks):
+            dist = abs(target - pos)
+            if dist == 0:
+                vel = 0.0
+                break
+            if accel > 0:
+                # Trapezoid: speed up, cap at vmax, slow down to stop on target.
+                vel = min(vel + accel, vmax, (2.0 * accel * dist) ** 0.5 + accel)
+            else:
+                vel = vmax
+            step = min(vel, dist)
+            pos += step if target > pos else -step
+        self.positions[chan] = pos
+        self.velocities[chan] = vel
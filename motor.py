@@ -1,5 +1,12 @@
+import logging
 import time
 
+import robot_log
+
+init_log = robot_log.get("INIT")
+log = robot_log.get("MOTOR")
+
+
 class Motor:
     def __init__(
         self,
@@ -23,41 +30,34 @@ class Motor:
         self.min_delta = min_delta
         self.max_delta = max_delta
 
-        print(
-            f"[INIT] Motor ch{self.channel} "
-            f"neutral={self.neutral} "
-            f"forward_sign={self.forward_sign} "
-            f"min_delta={self.min_delta}"
+        init_log.info(
+            "Motor ch%d neutral=%d forward_sign=%d min_delta=%d",
+            self.channel, self.neutral, self.forward_sign, self.min_delta,
         )
 
         # Arm / initialize. May also stop motor 
-        print(f"[MOTOR] ch{self.channel} ARM/STOP -> {self.neutral}")
-        self.maestro.setTarget(self.channel, self.neutral)
+        log.info("ch%d ARM/STOP -> %d", self.channel, self.neutral)
+        self.maestro.setTarget(self.channel, self.neutral, force=True)
         time.sleep(arm_time)
 
     def _clamp_delta(self, delta):
         delta = abs(int(delta))
         if delta < self.min_delta:
-            print(
-                f"[MOTOR WARN] ch{self.channel} delta {delta} < "
-                f"{self.min_delta}, raising"
-            )
+            log.warning("ch%d delta %d < %d, raising", self.channel, delta, self.min_delta)
             delta = self.min_delta
         if delta > self.max_delta:
-            print(
-                f"[MOTOR WARN] ch{self.channel} delta {delta} > "
-                f"{self.max_delta}, clamping"
-            )
+            log.warning("ch%d delta %d > %d, clamping", self.channel, delta, self.max_delta)
             delta = self.max_delta
         return delta
 
-    def _send(self, value, label=""):
-        direction = (
-            "STOP" if value == self.neutral
-            else ("HIGH(+)" if value > self.neutral else "LOW(-)")
-        )
-        print(f"[MOTOR] {label} ch{self.channel} {direction} -> {value}")
-        self.maestro.setTarget(self.channel, value)
+    def _send(self, value, label="", force=False):
+        if log.isEnabledFor(logging.DEBUG):
+            direction = (
+                "STOP" if value == self.neutral
+                else ("HIGH(+)" if value > self.neutral else "LOW(-)")
+            )
+            log.debug("%s ch%d %s -> %d", label, self.channel, direction, value)
+        self.maestro.setTarget(self.channel, value, force=force)
 
     def forward(self, speed=800):
         d = self._clamp_delta(speed)
@@ -68,4 +68,5 @@ class Motor:
         self._send(self.neutral - (self.forward_sign * d), "BACKWARD")
 
     def stop_motor(self):
-        self._send(self.neutral, "STOP")
+        # Stops always hit the wire, even with write coalescing enabled.
+        self._send(self.neutral, "STOP", force=True)
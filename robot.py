@@ -1,6 +1,11 @@
+import robot_log
 from motor import Motor
 from servo import Servo
 
+init_log = robot_log.get("INIT")
+log = robot_log.get("ROBOT")
+
+
 class Robot:
     SERVO_NEUTRALS = {
         "head_pan": 5800,
@@ -20,8 +25,24 @@ class Robot:
         "left_hand_pinch": 2000,
     }
 
+    ARM_JOINTS = [
+        "right_shoulder_ud",
+        "right_shoulder_yaw",
+        "right_elbow_ud",
+        "right_wrist_ud",
+        "right_wrist_rot",
+        "right_hand_pinch",
+        "left_wrist_rot",
+        "left_shoulder_ud",
+        "left_shoulder_yaw",
+        "left_elbow_ud",
+        "left_wrist_ud",
+        "left_hand_pinch",
+    ]
+
     def __init__(self, maestro):
-        print("[INIT] Robot initializing")
+        init_log.info("Robot initializing")
+        self.maestro = maestro
 
         # Wheels
         # LEFT wheel moves robot forward when value > 6000
@@ -61,7 +82,7 @@ class Robot:
         self.left_wrist_ud = Servo(maestro, 15, center_val=self.SERVO_NEUTRALS["left_wrist_ud"])
         self.left_hand_pinch = Servo(maestro, 16, center_val=self.SERVO_NEUTRALS["left_hand_pinch"])
 
-        print("[INIT] Robot ready")
+        init_log.info("Robot ready")
 
     def servo_neutral(self, attr_name):
         return self.SERVO_NEUTRALS[attr_name]
@@ -82,48 +103,47 @@ class Robot:
             self.left_hand_pinch,
         ]
 
+    def set_pose(self, pose):
+        """
+        Move several servos at once. pose maps servo attribute name -> value.
+        Each value is clamped to that servo's range, then the whole pose goes
+        out as one batched Maestro write so the joints start together.
+        """
+        targets = {}
+        for attr_name, value in pose.items():
+            servo = getattr(self, attr_name)
+            targets[servo.channel] = servo.clamp(value)
+        log.debug("POSE %d servos -> %s", len(targets), targets)
+        self.maestro.setTargets(targets)
+
     def set_arms_neutral(self):
-        print("[ROBOT] ARMS NEUTRAL -> configured values")
-        for attr_name in [
-            "right_shoulder_ud",
-            "right_shoulder_yaw",
-            "right_elbow_ud",
-            "right_wrist_ud",
-            "right_wrist_rot",
-            "right_hand_pinch",
-            "left_wrist_rot",
-            "left_shoulder_ud",
-            "left_shoulder_yaw",
-            "left_elbow_ud",
-            "left_wrist_ud",
-            "left_hand_pinch",
-        ]:
-            getattr(self, attr_name).move(self.servo_neutral(attr_name))
+        log.info("ARMS NEUTRAL -> configured values")
+        self.set_pose({name: self.servo_neutral(name) for name in self.ARM_JOINTS})
 
     # -------- Drive --------
 
     def stop(self):
-        print("[ROBOT] STOP")
+        log.debug("STOP")
         self.left_wheel.stop_motor()
         self.right_wheel.stop_motor()
 
     def drive_forward(self, speed=800):
-        print(f"[ROBOT] DRIVE FORWARD speed={speed}")
+        log.debug("DRIVE FORWARD speed=%s", speed)
         self.left_wheel.forward(speed)
         self.right_wheel.forward(speed)
 
     def drive_backward(self, speed=800):
-        print(f"[ROBOT] DRIVE BACKWARD speed={speed}")
+        log.debug("DRIVE BACKWARD speed=%s", speed)
         self.left_wheel.backward(speed)
         self.right_wheel.backward(speed)
 
     def turn_left(self, speed=800):
-        print(f"[ROBOT] TURN LEFT speed={speed}")
+        log.debug("TURN LEFT speed=%s", speed)
         self.left_wheel.backward(speed)
         self.right_wheel.forward(speed)
 
     def turn_right(self, speed=800):
-        print(f"[ROBOT] TURN RIGHT speed={speed}")
+        log.debug("TURN RIGHT speed=%s", speed)
         self.left_wheel.forward(speed)
         self.right_wheel.backward(speed)
 
@@ -1,6 +1,11 @@
 from maestro import Controller
 from robot import Robot
 import time
+import trajectory
+import robot_log
+from drive_loop import DriveLoop
+
+log = robot_log.get("CTRL")
 
 def clamp(x, lo, hi):
     return lo if x < lo else hi if x > hi else x
@@ -29,24 +34,84 @@ class RobotControl:
         self.DRIVE_MIN = 800
         self.DRIVE_MAX = 1600  # safety cap
 
+        # Optional fixed-rate drive thread; None means drive() writes inline.
+        self.drive_loop = None
+
         self.stop()  # start safe
 
+    def start_drive_loop(self, rate_hz=50.0, slew_per_s=6000.0, lease_s=0.5):
+        """
+        From now on drive() only sets a setpoint; a DriveLoop thread applies
+        it at rate_hz with slew limiting and lease expiry.
+        """
+        if self.drive_loop is None:
+            self.drive_loop = DriveLoop(
+                self._apply_drive,
+                rate_hz=rate_hz,
+                slew_per_s=slew_per_s,
+                lease_s=lease_s,
+                deadband=self.DRIVE_MIN,
+            )
+
     # -------------------------
     # STOP / neutral
     # -------------------------
     def stop(self):
-        print("[CTRL] STOP/NEUTRAL")
+        log.info("STOP/NEUTRAL")
+        if self.drive_loop is not None:
+            self.drive_loop.reset()
         self.robot.stop()
 
+    def force_stop(self, hold_s=3.0, period_s=0.05, triggered_at=None, on_first_neutral=None):
+        """
+        Emergency stop on the existing Maestro handle: neutral wheel targets
+        go out as urgent frames ahead of any queued writes, repeated every
+        period_s for hold_s. Returns seconds from triggered_at (monotonic,
+        default now) until the first neutral frame was written; that value
+        is also passed to on_first_neutral before the hold starts.
+        """
+        if triggered_at is None:
+            triggered_at = time.monotonic()
+        if self.drive_loop is not None:
+            self.drive_loop.reset()
+        neutral = {
+            motor.channel: motor.neutral
+            for motor in (self.robot.left_wheel, self.robot.right_wheel)
+        }
+        self.maestro.forceTargets(neutral).result(timeout=1.0)
+        latency = time.monotonic() - triggered_at
+        log.warning("FORCE STOP first neutral after %.2fms", latency * 1000.0)
+        if on_first_neutral is not None:
+            on_first_neutral(latency)
+        end = time.monotonic() + hold_s
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(period_s, remaining))
+            self.maestro.forceTargets(neutral)
+        return latency
+
     # -------------------------
     # Driving
     # -------------------------
-    def drive(self, left_speed, right_speed):
+    def drive(self, left_speed, right_speed, direct=False):
         """
         left_speed/right_speed are deltas from neutral (6000).
         Positive means "robot forward" for that wheel, negative means backward.
         Example: +800 is minimum motion.
+        With the drive loop running this only updates its setpoint, unless
+        direct=True: then the loop is reset and the speeds are written now,
+        with no slew limit or lease (timed moves such as gesture calls).
         """
+        if self.drive_loop is not None:
+            if not direct:
+                self.drive_loop.set(left_speed, right_speed)
+                return
+            self.drive_loop.reset()
+        self._apply_drive(left_speed, right_speed)
+
+    def _apply_drive(self, left_speed, right_speed):
         left_speed = int(clamp(left_speed, -self.DRIVE_MAX, self.DRIVE_MAX))
         right_speed = int(clamp(right_speed, -self.DRIVE_MAX, self.DRIVE_MAX))
 
@@ -56,7 +121,7 @@ class RobotControl:
         if right_speed != 0 and abs(right_speed) < self.DRIVE_MIN:
             right_speed = self.DRIVE_MIN if right_speed > 0 else -self.DRIVE_MIN
 
-        print(f"[CTRL] drive left={left_speed} right={right_speed}")
+        log.debug("drive left=%d right=%d", left_speed, right_speed)
 
         # Robot methods accept "speed" as positive magnitude, so we route signs here
         if left_speed == 0:
@@ -73,38 +138,38 @@ class RobotControl:
         else:
             self.robot.right_wheel.backward(abs(right_speed))
 
-    def forward(self, speed=800):
-        print(f"[CTRL] forward speed={speed}")
-        self.drive(speed, speed)
+    def forward(self, speed=800, direct=False):
+        log.debug("forward speed=%s", speed)
+        self.drive(speed, speed, direct=direct)
 
-    def backward(self, speed=800):
-        print(f"[CTRL] backward speed={speed}")
-        self.drive(-speed, -speed)
+    def backward(self, speed=800, direct=False):
+        log.debug("backward speed=%s", speed)
+        self.drive(-speed, -speed, direct=direct)
 
-    def turn_left(self, speed=800):
-        print(f"[CTRL] turn_left speed={speed}")
-        self.drive(-speed, speed)
+    def turn_left(self, speed=800, direct=False):
+        log.debug("turn_left speed=%s", speed)
+        self.drive(-speed, speed, direct=direct)
 
-    def turn_right(self, speed=800):
-        print(f"[CTRL] turn_right speed={speed}")
-        self.drive(speed, -speed)
+    def turn_right(self, speed=800, direct=False):
+        log.debug("turn_right speed=%s", speed)
+        self.drive(speed, -speed, direct=direct)
 
     # -------------------------
     # Head + Waist
     # -------------------------
     def head_pan(self, value):
         value = int(clamp(value, self.HEAD_PAN_MIN, self.HEAD_PAN_MAX))
-        print(f"[CTRL] head_pan -> {value}")
+        log.debug("head_pan -> %d", value)
         self.robot.head_pan.move(value)
 
     def head_tilt(self, value):
         value = int(clamp(value, self.HEAD_TILT_MIN, self.HEAD_TILT_MAX))
-        print(f"[CTRL] head_tilt -> {value}")
+        log.debug("head_tilt -> %d", value)
         self.robot.head_tilt.move(value)
 
     def waist(self, value):
         value = int(clamp(value, self.WAIST_MIN, self.WAIST_MAX))
-        print(f"[CTRL] waist -> {value}")
+        log.debug("waist -> %d", value)
         self.robot.waist.move(value)
 
     def center_pose(self):
@@ -121,9 +186,81 @@ class RobotControl:
         servo = getattr(self.robot, attr_name, None)
         if servo is None:
             raise ValueError(f"{label} servo is not configured")
-        print(f"[CTRL] {label} -> {value}")
+        log.debug("%s -> %d", label, value)
         servo.move(value)
 
+    def joint_limits(self, name):
+        """
+        (min, max) accepted for a joint: this layer's safe limits narrowed by
+        the servo's own range. Raises ValueError for unknown joints.
+        """
+        servo = getattr(self.robot, name, None)
+        if servo is None or not hasattr(servo, "clamp"):
+            raise ValueError(f"{name} servo is not configured")
+        lo, hi = {
+            "head_pan": (self.HEAD_PAN_MIN, self.HEAD_PAN_MAX),
+            "head_tilt": (self.HEAD_TILT_MIN, self.HEAD_TILT_MAX),
+            "waist": (self.WAIST_MIN, self.WAIST_MAX),
+        }.get(name, (2000, 8000))
+        return max(lo, servo.min), min(hi, servo.max)
+
+    def validate_pose(self, pose):
+        """
+        Check every joint and value of a pose in one pass. Returns a list of
+        error strings (empty if the whole pose is acceptable).
+        """
+        errors = []
+        for name, value in pose.items():
+            try:
+                lo, hi = self.joint_limits(name)
+            except ValueError as ex:
+                errors.append(str(ex))
+                continue
+            if isinstance(value, bool) or not isinstance(value, int):
+                errors.append(f"{name}: value must be int")
+            elif not lo <= value <= hi:
+                errors.append(f"{name}: {value} outside {lo}..{hi}")
+        return errors
+
+    def set_pose(self, pose):
+        """
+        pose maps servo attribute name -> value; applied as one batched write.
+        Values are clamped to the same 2000..8000 range as single joints.
+        """
+        for name in pose:
+            if getattr(self.robot, name, None) is None:
+                raise ValueError(f"{name} servo is not configured")
+        pose = {name: int(clamp(value, 2000, 8000)) for name, value in pose.items()}
+        log.debug("pose -> %s", pose)
+        self.robot.set_pose(pose)
+
+    def play_trajectory(self, traj, cancel_event=None, deadline=None, rate_hz=trajectory.DEFAULT_RATE_HZ):
+        """
+        Run a trajectory.Trajectory as one timed loop of batched writes.
+        Joints start from their current Maestro targets; every setpoint is
+        clamped like set_pose. deadline is a time.monotonic() value.
+        Returns False if cancelled or past deadline.
+        """
+        servos = {}
+        for name in traj.joints():
+            servo = getattr(self.robot, name, None)
+            if servo is None:
+                raise ValueError(f"{name} servo is not configured")
+            servos[name] = servo
+        channels = {name: servo.channel for name, servo in servos.items()}
+        start = {
+            name: self.maestro.Targets[servo.channel]
+            for name, servo in servos.items()
+            if self.maestro.Targets[servo.channel]
+        }
+        limits = {servo.channel: servo for servo in servos.values()}
+        frames = [
+            (t, {ch: limits[ch].clamp(int(clamp(v, 2000, 8000))) for ch, v in targets.items()})
+            for t, targets in traj.compile(channels, rate_hz=rate_hz, start=start)
+        ]
+        log.info("trajectory %s %.2fs, %d frames @ %sHz", traj.profile, traj.duration, len(frames), rate_hz)
+        return trajectory.play(self.maestro, frames, cancel_event=cancel_event, deadline=deadline)
+
     def right_shoulder_ud(self, value):
         self._arm_move("right_shoulder_ud", "right_shoulder_ud", value)
 
@@ -175,12 +312,12 @@ class RobotControl:
                 return True
             return False
 
-        def move_if_exists(name, value):
-            servo = getattr(self.robot, name, None)
-            if servo is not None:
-                servo.move(value)
-                return True
-            return False
+        def pose_if_exists(pose):
+            # Only joints this robot actually has; True if any were sent.
+            pose = {name: v for name, v in pose.items() if getattr(self.robot, name, None) is not None}
+            if pose:
+                self.robot.set_pose(pose)
+            return bool(pose)
 
         def neutral(name):
             return self.robot.servo_neutral(name)
@@ -191,23 +328,23 @@ class RobotControl:
         if should_stop():
             return
 
-        moved_any = False
-        # Phase 1: raise shoulders and elbows.
-        # Shoulder U/D and shoulder yaw are mirrored left/right by opposite deltas.
-        moved_any |= move_if_exists("right_shoulder_ud", with_delta("right_shoulder_ud", +1100))
-        moved_any |= move_if_exists("left_shoulder_ud", with_delta("left_shoulder_ud", -1100))
-        moved_any |= move_if_exists("right_elbow_ud", with_delta("right_elbow_ud", +900))
-        moved_any |= move_if_exists("left_elbow_ud", with_delta("left_elbow_ud", +900))
-        moved_any |= move_if_exists("right_shoulder_yaw", with_delta("right_shoulder_yaw", +600))
-        moved_any |= move_if_exists("left_shoulder_yaw", with_delta("left_shoulder_yaw", -600))
-
-        # Phase 2: wrist and hand flourish.
-        moved_any |= move_if_exists("right_wrist_ud", with_delta("right_wrist_ud", -200))
-        moved_any |= move_if_exists("left_wrist_ud", with_delta("left_wrist_ud", -200))
-        moved_any |= move_if_exists("right_wrist_rot", with_delta("right_wrist_rot", +300))
-        moved_any |= move_if_exists("left_wrist_rot", with_delta("left_wrist_rot", -300))
-        moved_any |= move_if_exists("right_hand_pinch", with_delta("right_hand_pinch", +500))
-        moved_any |= move_if_exists("left_hand_pinch", with_delta("left_hand_pinch", +500))
+        # Whole raised pose in one write: shoulders and elbows, then the
+        # wrist and hand flourish. Shoulder U/D and shoulder yaw are mirrored
+        # left/right by opposite deltas.
+        moved_any = pose_if_exists({
+            "right_shoulder_ud": with_delta("right_shoulder_ud", +1100),
+            "left_shoulder_ud": with_delta("left_shoulder_ud", -1100),
+            "right_elbow_ud": with_delta("right_elbow_ud", +900),
+            "left_elbow_ud": with_delta("left_elbow_ud", +900),
+            "right_shoulder_yaw": with_delta("right_shoulder_yaw", +600),
+            "left_shoulder_yaw": with_delta("left_shoulder_yaw", -600),
+            "right_wrist_ud": with_delta("right_wrist_ud", -200),
+            "left_wrist_ud": with_delta("left_wrist_ud", -200),
+            "right_wrist_rot": with_delta("right_wrist_rot", +300),
+            "left_wrist_rot": with_delta("left_wrist_rot", -300),
+            "right_hand_pinch": with_delta("right_hand_pinch", +500),
+            "left_hand_pinch": with_delta("left_hand_pinch", +500),
+        })
 
         if moved_any:
             time.sleep(0.55)
@@ -215,18 +352,7 @@ class RobotControl:
                 return
 
             # Return to neutral.
-            move_if_exists("right_shoulder_ud", neutral("right_shoulder_ud"))
-            move_if_exists("left_shoulder_ud", neutral("left_shoulder_ud"))
-            move_if_exists("right_elbow_ud", neutral("right_elbow_ud"))
-            move_if_exists("left_elbow_ud", neutral("left_elbow_ud"))
-            move_if_exists("right_shoulder_yaw", neutral("right_shoulder_yaw"))
-            move_if_exists("left_shoulder_yaw", neutral("left_shoulder_yaw"))
-            move_if_exists("right_wrist_ud", neutral("right_wrist_ud"))
-            move_if_exists("left_wrist_ud", neutral("left_wrist_ud"))
-            move_if_exists("right_wrist_rot", neutral("right_wrist_rot"))
-            move_if_exists("left_wrist_rot", neutral("left_wrist_rot"))
-            move_if_exists("right_hand_pinch", neutral("right_hand_pinch"))
-            move_if_exists("left_hand_pinch", neutral("left_hand_pinch"))
+            pose_if_exists({name: neutral(name) for name in self.robot.ARM_JOINTS})
             time.sleep(0.25)
             return
 
@@ -246,31 +372,36 @@ class RobotControl:
         Quick arm validation:
         neutral -> open pose -> neutral.
         """
-        print("[CTRL] test_arms_basic start")
+        log.info("test_arms_basic start")
         self.reset_arms_neutral()
         time.sleep(hold_s)
 
-        # Open visible pose.
-        self.robot.right_shoulder_ud.move(int(clamp(self.robot.servo_neutral("right_shoulder_ud") + 1100, 2000, 8000)))
-        self.robot.left_shoulder_ud.move(int(clamp(self.robot.servo_neutral("left_shoulder_ud") - 1100, 2000, 8000)))
-        self.robot.right_shoulder_yaw.move(int(clamp(self.robot.servo_neutral("right_shoulder_yaw") + 600, 2000, 8000)))
-        self.robot.left_shoulder_yaw.move(int(clamp(self.robot.servo_neutral("left_shoulder_yaw") - 600, 2000, 8000)))
-        self.robot.right_elbow_ud.move(int(clamp(self.robot.servo_neutral("right_elbow_ud") + 900, 2000, 8000)))
-        self.robot.left_elbow_ud.move(int(clamp(self.robot.servo_neutral("left_elbow_ud") + 900, 2000, 8000)))
-        self.robot.right_wrist_ud.move(int(clamp(self.robot.servo_neutral("right_wrist_ud") - 200, 2000, 8000)))
-        self.robot.left_wrist_ud.move(int(clamp(self.robot.servo_neutral("left_wrist_ud") - 200, 2000, 8000)))
-        self.robot.right_hand_pinch.move(int(clamp(self.robot.servo_neutral("right_hand_pinch") + 500, 2000, 8000)))
-        self.robot.left_hand_pinch.move(int(clamp(self.robot.servo_neutral("left_hand_pinch") + 500, 2000, 8000)))
+        # Open visible pose, sent as one batched write.
+        deltas = {
+            "right_shoulder_ud": +1100,
+            "left_shoulder_ud": -1100,
+            "right_shoulder_yaw": +600,
+            "left_shoulder_yaw": -600,
+            "right_elbow_ud": +900,
+            "left_elbow_ud": +900,
+            "right_wrist_ud": -200,
+            "left_wrist_ud": -200,
+            "right_hand_pinch": +500,
+            "left_hand_pinch": +500,
+        }
+        self.set_pose({name: self.robot.servo_neutral(name) + d for name, d in deltas.items()})
         time.sleep(hold_s)
 
         self.reset_arms_neutral()
-        print("[CTRL] test_arms_basic done")
+        log.info("test_arms_basic done")
 
     # -------------------------
     # Cleanup
     # -------------------------
     def close(self):
-        print("[CTRL] close")
+        log.info("close")
+        if self.drive_loop is not None:
+            self.drive_loop.close()
         self.stop()
         self.maestro.close()
 
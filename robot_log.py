@@ -0,0 +1,261 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# Leveled, asynchronous logging for the robot modules.
+#
+# Each subsystem gets a logger named after its console tag (get("SERVO")
+# prints "[SERVO] ..."); warnings and errors print as "[SERVO WARN] ..." and
+# "[SERVO ERROR] ...". Records go onto a bounded queue and a background
+# thread writes them to stdout, so a slow terminal or journald never blocks a
+# control thread; when the queue is full, records are dropped and counted.
+#
+# Call sites pass %-style arguments (log.debug("ch%d -> %d", ch, v)): with the
+# level disabled the call returns after a cached level check and nothing is
+# formatted. Formatting happens on the writer thread, so pass values, not
+# objects that are mutated afterwards.
+#
+# Levels: default INFO, set per subsystem with ROBOT_LOG or configure(), e.g.
+# ROBOT_LOG="SERVO=debug,MOTOR=debug" or ROBOT_LOG="warning,CTRL=info".
+# The high-rate tags in RATE_LIMITED are capped at RATE_PER_S lines per second
+# (bursts up to RATE_BURST; errors are never dropped); a note with the
+# suppressed count follows the gap.
+
+ROOT = "robot"
+DEFAULT_LEVEL = logging.INFO
+QUEUE_SIZE = 10000
+RATE_LIMITED = ("SERVO", "MOTOR", "CTRL")
+RATE_PER_S = 20.0
+RATE_BURST = 40
+
+_setup_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+_handler: Optional["_DroppingQueueHandler"] = None
+_limits: Dict[str, "_RateLimit"] = {}
+_logs: Dict[str, "Log"] = {}
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Same process: hand the record over as-is and format it on the
+        # writer thread.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _BlockingStopListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room so stop() still flushes a full queue.
+        self.queue.put(self._sentinel)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    # Looks up sys.stdout per record, like print(), so redirect_stdout works.
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _TagFormatter(logging.Formatter):
+    def format(self, record):
+        tag = record.name[len(ROOT) + 1:]
+        if record.levelno >= logging.ERROR:
+            tag += " ERROR"
+        elif record.levelno >= logging.WARNING:
+            tag += " WARN"
+        text = f"[{tag}] {record.getMessage()}"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class _RateLimit:
+    """
+    Token bucket for one subsystem. Only consulted for enabled levels.
+    """
+
+    def __init__(self, per_s: float, burst: int):
+        self.per_s = per_s
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.suppressed = 0
+        self.total_suppressed = 0
+        self.lock = threading.Lock()
+
+    def take(self) -> int:
+        """
+        -1 if this line should be dropped, else the number dropped since the
+        last line that got through.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.per_s)
+            self.last = now
+            if self.tokens < 1.0:
+                self.suppressed += 1
+                self.total_suppressed += 1
+                return -1
+            self.tokens -= 1.0
+            suppressed, self.suppressed = self.suppressed, 0
+            return suppressed
+
+
+class Log:
+    """
+    One subsystem's logger: the usual debug/info/warning/error calls, with
+    the level check first and no caller lookup, so enabled lines stay cheap
+    too. Errors bypass the rate limit.
+    """
+
+    __slots__ = ("logger", "limit")
+
+    def __init__(self, logger: logging.Logger, limit: Optional[_RateLimit] = None):
+        self.logger = logger
+        self.limit = limit
+
+    def isEnabledFor(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def setLevel(self, level) -> None:
+        self.logger.setLevel(level)
+
+    def _emit(self, level: int, msg: str, args: tuple) -> None:
+        if self.limit is not None and level < logging.ERROR:
+            suppressed = self.limit.take()
+            if suppressed < 0:
+                return
+            if suppressed:
+                msg = f"{msg} ({suppressed} lines suppressed)"
+        self.logger.handle(self.logger.makeRecord(self.logger.name, level, "", 0, msg, args, None))
+
+    def debug(self, msg: str, *args) -> None:
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._emit(logging.DEBUG, msg, args)
+
+    def info(self, msg: str, *args) -> None:
+        if self.logger.isEnabledFor(logging.INFO):
+            self._emit(logging.INFO, msg, args)
+
+    def warning(self, msg: str, *args) -> None:
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._emit(logging.WARNING, msg, args)
+
+    def error(self, msg: str, *args) -> None:
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._emit(logging.ERROR, msg, args)
+
+
+def _parse_levels(spec: str):
+    default = None
+    levels = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, level = part.rpartition("=")
+        value = logging.getLevelName(level.strip().upper())
+        if not isinstance(value, int):
+            print(f"[LOG WARN] unknown level in ROBOT_LOG: {part}", file=sys.stderr)
+            continue
+        if sep:
+            levels[name.strip().upper()] = value
+        else:
+            default = value
+    return default, levels
+
+
+def _setup() -> None:
+    global _listener, _handler
+    with _setup_lock:
+        if _handler is not None:
+            return
+        q = queue.Queue(QUEUE_SIZE)
+        stream = _StdoutHandler()
+        stream.setFormatter(_TagFormatter())
+        _handler = _DroppingQueueHandler(q)
+        root = logging.getLogger(ROOT)
+        root.addHandler(_handler)
+        root.setLevel(DEFAULT_LEVEL)
+        # Keep robot lines out of the root logger (werkzeug, etc.).
+        root.propagate = False
+        for tag in RATE_LIMITED:
+            _limits[tag] = _RateLimit(RATE_PER_S, RATE_BURST)
+        _listener = _BlockingStopListener(q, stream)
+        _listener.start()
+        atexit.register(shutdown)
+    configure(os.environ.get("ROBOT_LOG", ""))
+
+
+def get(subsystem: str) -> Log:
+    """
+    Logger for one subsystem; its name is the console tag.
+    """
+    if _handler is None:
+        _setup()
+    with _setup_lock:
+        log = _logs.get(subsystem)
+        if log is None:
+            log = _logs[subsystem] = Log(logging.getLogger(f"{ROOT}.{subsystem}"), _limits.get(subsystem))
+        return log
+
+
+def configure(spec: str = "", default: Optional[int] = None) -> None:
+    """
+    Apply a level spec like "warning,SERVO=debug". A bare level sets the
+    default for every subsystem not named; default= overrides it.
+    """
+    if _handler is None:
+        _setup()
+    spec_default, levels = _parse_levels(spec or "")
+    default = default if default is not None else spec_default
+    if default is not None:
+        logging.getLogger(ROOT).setLevel(default)
+    for name, level in levels.items():
+        logging.getLogger(f"{ROOT}.{name}").setLevel(level)
+
+
+def stats() -> dict:
+    return {
+        "queued": _handler.queue.qsize() if _handler is not None else 0,
+        "dropped": _handler.dropped if _handler is not None else 0,
+        "suppressed": {tag: limit.total_suppressed for tag, limit in _limits.items()},
+    }
+
+
+def flush() -> None:
+    """
+    Block until every queued record has been written.
+    """
+    if _handler is not None and _listener is not None:
+        _handler.queue.join()
+
+
+def shutdown() -> None:
+    """
+    Write out everything still queued. Safe to call more than once.
+    """
+    global _listener
+    with _setup_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
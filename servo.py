@@ -1,3 +1,9 @@
+import robot_log
+
+init_log = robot_log.get("INIT")
+log = robot_log.get("SERVO")
+
+
 class Servo:
     def __init__(self, maestro, channel, min_val=2000, max_val=8000, center_val=5000):
         self.maestro = maestro
@@ -7,23 +13,25 @@ class Servo:
         self.center = center_val
 
         maestro.setRange(channel, self.min, self.max)
-        print(
-            f"[INIT] Servo ch{self.channel} "
-            f"range=({self.min},{self.max}) "
-            f"center={self.center}"
-        )
+        init_log.info("Servo ch%d range=(%d,%d) center=%d", self.channel, self.min, self.max, self.center)
 
-    def move(self, value):
-        raw = value
+    def clamp(self, value):
         if value < self.min:
             value = self.min
         if value > self.max:
             value = self.max
+        return value
+
+    def move(self, value):
+        raw = value
+        value = self.clamp(value)
 
-        note = "" if raw == value else f" (clamped from {raw})"
-        print(f"[SERVO] ch{self.channel} -> {value}{note}")
+        if raw == value:
+            log.debug("ch%d -> %d", self.channel, value)
+        else:
+            log.debug("ch%d -> %d (clamped from %s)", self.channel, value, raw)
         self.maestro.setTarget(self.channel, value)
 
     def center_servo(self):
-        print(f"[SERVO] ch{self.channel} CENTER -> {self.center}")
+        log.debug("ch%d CENTER -> %d", self.channel, self.center)
         self.move(self.center)
@@ -0,0 +1,315 @@
+import hashlib
+import os
+import queue
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+import robot_log
+
+# Long-lived text-to-speech worker.
+#
+# One espeak-ng process is kept running in line mode: with no text argument
+# it reads stdin and speaks each line as it arrives, so the voice is loaded
+# once instead of per reply. Utterances go through one FIFO queue and one
+# worker thread, so replies are spoken in order and never overlap. cancel()
+# (barge-in) drops everything queued and kills the engine mid-sentence; a
+# fresh engine is started for the next utterance.
+#
+# With a WavCache attached, utterances are played from rendered WAV files
+# instead (one aplay per reply, waited on, so order still holds). Cached
+# replies start playing with no synthesis delay; a miss is rendered once,
+# then cached.
+
+ESPEAK_VOICE = "en-us"
+ESPEAK_RATE = 165
+ESPEAK_CMD = ["espeak-ng", "-s", str(ESPEAK_RATE), "-v", ESPEAK_VOICE]
+PLAYER_CMD = ["aplay", "-q"]
+
+log = robot_log.get("TTS")
+
+
+class WavCache:
+    """
+    Disk-backed LRU of synthesized WAV files keyed on (text, voice, rate).
+    Files live in directory as <sha1>.wav; recency is the file mtime, so the
+    order survives restarts. Oldest files are evicted past max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024,
+                 voice: str = ESPEAK_VOICE, rate: int = ESPEAK_RATE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.voice = voice
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith(".wav"):
+                st = os.stat(os.path.join(directory, name))
+                entries.append((st.st_mtime_ns, name[:-4], st.st_size))
+        # key -> size, least recently used first.
+        self._entries: "OrderedDict[str, int]" = OrderedDict(
+            (key, size) for _, key, size in sorted(entries)
+        )
+        self._bytes = sum(self._entries.values())
+        self._evict()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.voice}\0{self.rate}\0{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".wav")
+
+    def get(self, text: str) -> Optional[str]:
+        """
+        Path of the cached WAV for text, or None on a miss.
+        """
+        key = self.key(text)
+        with self.lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self._drop(key)
+            return None
+        return path
+
+    def render(self, text: str) -> Optional[str]:
+        """
+        Synthesize text into the cache (no-op if present); returns its path,
+        or None if espeak-ng failed or is missing.
+        """
+        key = self.key(text)
+        path = self.path(key)
+        with self.lock:
+            if key in self._entries:
+                return path
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        # "--" ends option parsing, so text starting with "-" (e.g. "-w/path")
+        # is spoken instead of taken as an espeak-ng option.
+        cmd = ["espeak-ng", "-s", str(self.rate), "-v", self.voice, "-w", tmp, "--", text]
+        try:
+            subprocess.run(cmd, check=False, timeout=30,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+        except (OSError, subprocess.SubprocessError):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return None
+        with self.lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self.renders += 1
+            self._evict()
+        return path
+
+    def prerender(self, texts: Iterable[str]) -> int:
+        """
+        Render every text not already cached; returns how many were rendered.
+        """
+        rendered = 0
+        for text in texts:
+            with self.lock:
+                present = self.key(text) in self._entries
+            if not present and self.render(text) is not None:
+                rendered += 1
+        return rendered
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "renders": self.renders,
+                "evictions": self.evictions,
+            }
+
+    # Caller holds self.lock.
+    def _drop(self, key: str) -> None:
+        self._bytes -= self._entries.pop(key, 0)
+
+    # Caller holds self.lock.
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+
+class TTSWorker:
+    def __init__(self, cmd: Optional[List[str]] = None, cache: Optional[WavCache] = None,
+                 player: Optional[List[str]] = None):
+        self.cmd = list(cmd or ESPEAK_CMD)
+        self.cache = cache
+        self.player = list(player or PLAYER_CMD)
+        self.q: "queue.Queue[tuple]" = queue.Queue()
+        self.lock = threading.Lock()
+        self.proc: Optional[subprocess.Popen] = None
+        self.available = True
+        # Bumped by cancel(); queued utterances from an older generation are
+        # skipped by the worker.
+        self.generation = 0
+        # Enqueue -> handed to the warm engine or the WAV player, in seconds
+        # (recent only).
+        self.first_audio_s: List[float] = []
+        self.spoken = 0
+        self.cancelled = 0
+        self.engine_starts = 0
+        self.worker = threading.Thread(target=self._worker_loop, daemon=True)
+        self.worker.start()
+
+    def speak(self, text: str) -> None:
+        if not text:
+            return
+        with self.lock:
+            self.q.put((self.generation, time.monotonic(), text))
+
+    def cancel(self) -> None:
+        """
+        Barge-in: drop queued utterances and cut off the one being spoken.
+        """
+        with self.lock:
+            self.generation += 1
+            while True:
+                try:
+                    self.q.get_nowait()
+                except queue.Empty:
+                    break
+                self.cancelled += 1
+            proc, self.proc = self.proc, None
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+            self.cancelled += 1
+
+    def close(self) -> None:
+        self.cancel()
+        self.q.put(None)
+
+    def warm_up(self) -> None:
+        """
+        Start the engine now so the first reply does not pay for it.
+        """
+        if self.cache is not None:
+            return
+        with self.lock:
+            self._engine()
+
+    def stats(self) -> dict:
+        with self.lock:
+            samples = sorted(self.first_audio_s)
+            queued = self.q.qsize()
+        out = {
+            "available": self.available,
+            "spoken": self.spoken,
+            "cancelled": self.cancelled,
+            "queued": queued,
+            "engine_starts": self.engine_starts,
+        }
+        if self.cache is not None:
+            out["cache"] = self.cache.stats()
+        if samples:
+            out["first_audio_p50_ms"] = round(samples[len(samples) // 2] * 1000.0, 2)
+            out["first_audio_max_ms"] = round(samples[-1] * 1000.0, 2)
+        return out
+
+    # Caller holds self.lock. Returns a running engine, or None if espeak-ng
+    # is missing.
+    def _engine(self) -> Optional[subprocess.Popen]:
+        if self.proc is not None and self.proc.poll() is None:
+            return self.proc
+        if not self.available:
+            return None
+        try:
+            self.proc = subprocess.Popen(
+                self.cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            )
+        except FileNotFoundError:
+            self.available = False
+            self.proc = None
+            log.warning("%s not installed; speech disabled", self.cmd[0])
+            return None
+        self.engine_starts += 1
+        return self.proc
+
+    def _play_cached(self, generation: int, queued_at: float, text: str) -> None:
+        path = self.cache.get(text) or self.cache.render(text)
+        if path is None:
+            log.warning("cannot render: %s", text)
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            try:
+                proc = subprocess.Popen(self.player + [path],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except FileNotFoundError:
+                log.warning("%s not installed; cannot play: %s", self.player[0], text)
+                return
+            self.proc = proc
+            self.spoken += 1
+            self.first_audio_s.append(time.monotonic() - queued_at)
+            del self.first_audio_s[:-500]
+        # Wait outside the lock so cancel() can kill it mid-sentence.
+        proc.wait()
+        with self.lock:
+            if self.proc is proc:
+                self.proc = None
+
+    def _worker_loop(self) -> None:
+        while True:
+            item = self.q.get()
+            if item is None:
+                break
+            generation, queued_at, text = item
+            if self.cache is not None:
+                self._play_cached(generation, queued_at, text)
+                continue
+            with self.lock:
+                if generation != self.generation:
+                    continue
+                proc = self._engine()
+                if proc is None:
+                    log.warning("cannot speak: %s", text)
+                    continue
+                try:
+                    proc.stdin.write(text + "\n")
+                    proc.stdin.flush()
+                except (BrokenPipeError, OSError) as ex:
+                    log.warning("engine write failed: %s", ex)
+                    self.proc = None
+                    continue
+                self.spoken += 1
+                self.first_audio_s.append(time.monotonic() - queued_at)
+                del self.first_audio_s[:-500]
+        with self.lock:
+            proc, self.proc = self.proc, None
+        if proc is not None and proc.poll() is None:
+            proc.stdin.close()
@@ -0,0 +1,70 @@
+import json
+import threading
+import time
+from typing import Iterator, Optional
+
+# Published robot/dialog state for dashboards.
+#
+# The current state is one dict that is never mutated: publish() builds a new
+# dict and swaps the reference, so readers (request handlers, the SSE stream)
+# just read .snapshot with no lock. Writers serialize on a Condition, which
+# also wakes the stream subscribers; an idle dashboard costs one blocked
+# thread and a keepalive comment now and then.
+
+
+class StateStream:
+    def __init__(self, **initial):
+        self.snapshot = dict(initial, seq=0, t=time.time())
+        self._cond = threading.Condition()
+
+    def publish(self, **changes) -> bool:
+        """
+        Apply changes to the snapshot and wake subscribers. Returns False
+        (and publishes nothing) if every value is already current.
+        """
+        with self._cond:
+            old = self.snapshot
+            if all(k in old and old[k] == v for k, v in changes.items()):
+                return False
+            new = dict(old)
+            new.update(changes)
+            new["seq"] = old["seq"] + 1
+            new["t"] = time.time()
+            self.snapshot = new
+            self._cond.notify_all()
+        return True
+
+    def update(self, key: str, fn) -> None:
+        """
+        Publish key = fn(current value), atomically with respect to other
+        writers. fn must return a new object, not mutate the old one.
+        """
+        with self._cond:
+            self.publish(**{key: fn(self.snapshot.get(key))})
+
+    def wait(self, seq: int, timeout: Optional[float] = None) -> dict:
+        """
+        The first snapshot newer than seq, or the current one on timeout.
+        """
+        snap = self.snapshot
+        if snap["seq"] != seq:
+            return snap
+        with self._cond:
+            self._cond.wait_for(lambda: self.snapshot["seq"] != seq, timeout)
+            return self.snapshot
+
+    def events(self, keepalive_s: float = 15.0) -> Iterator[str]:
+        """
+        Server-sent events: the current snapshot, then one event per change.
+        Changes published faster than the client reads are coalesced into the
+        latest snapshot.
+        """
+        seq = None
+        while True:
+            snap = self.wait(seq, timeout=keepalive_s) if seq is not None else self.snapshot
+            if snap["seq"] == seq:
+                # Lets the server notice a client that has gone away.
+                yield ": keepalive\n\n"
+                continue
+            seq = snap["seq"]
+            yield f"id: {seq}\ndata: {json.dumps(snap, separators=(',', ':'))}\n\n"
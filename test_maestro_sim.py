@@ -0,0 +1,68 @@
+from maestro import Controller
+from maestro_sim import SimulatedSerial, TICK_S
+
+# Motion model checks for the simulator; no hardware needed.
+# Run directly (python test_maestro_sim.py) or under pytest.
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+    def advance(self, ticks):
+        self.t += ticks * TICK_S
+
+
+def make(speed, accel, start=4000):
+    clock = FakeClock()
+    m = Controller(usb=SimulatedSerial(clock=clock))
+    m.setTarget(0, start)  # first target: channel starts there
+    m.setSpeed(0, speed)
+    m.setAccel(0, accel)
+    return m, clock
+
+
+def run_until_settled(m, clock, max_ticks=1000):
+    for tick in range(max_ticks):
+        if not m.getMovingState():
+            return tick
+        clock.advance(1)
+    raise AssertionError("channel still moving after %d ticks" % max_ticks)
+
+
+def test_speed_zero_with_accel_ramps():
+    m, clock = make(speed=0, accel=5)
+    m.setTarget(0, 8000)
+    assert m.getPosition(0) == 4000, "jumped to target despite acceleration limit"
+    clock.advance(5)
+    assert 4000 < m.getPosition(0) < 8000
+    run_until_settled(m, clock)
+    assert m.getPosition(0) == 8000
+
+
+def test_speed_zero_mid_move_finishes():
+    for accel in (0, 5):
+        m, clock = make(speed=20, accel=accel)
+        m.setTarget(0, 8000)
+        clock.advance(10)
+        assert 4000 < m.getPosition(0) < 8000
+        m.setSpeed(0, 0)
+        run_until_settled(m, clock)
+        assert m.getPosition(0) == 8000
+
+
+def test_unlimited_jumps():
+    m, clock = make(speed=0, accel=0)
+    m.setTarget(0, 8000)
+    assert m.getPosition(0) == 8000
+    assert not m.getMovingState()
+
+
+if __name__ == "__main__":
+    for name, fn in sorted(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print("ok", name)
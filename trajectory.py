@@ -0,0 +1,157 @@
+import bisect
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Keyframe motion profiles for servo gestures.
+#
+# A Trajectory holds (time, target) keyframes per joint and produces the
+# interpolated setpoint of every joint at any time. compile() turns it into
+# fixed-rate frames of channel targets, and play() streams those frames to
+# the Maestro as batched writes from one timed loop.
+
+DEFAULT_RATE_HZ = 50
+
+# Event.wait can wake a fraction of a millisecond late; the tail of each wait
+# is spun instead so steps start on schedule.
+SPIN_S = 0.001
+
+
+def _linear(u: float) -> float:
+    return u
+
+
+def _min_jerk(u: float) -> float:
+    # 10u^3 - 15u^4 + 6u^5: zero velocity and acceleration at both ends.
+    return u * u * u * (10.0 + u * (-15.0 + 6.0 * u))
+
+
+PROFILES = {
+    "linear": _linear,
+    "min_jerk": _min_jerk,
+}
+
+
+class Trajectory:
+    """
+    keyframes maps joint name -> [(t_seconds, target), ...].
+    A joint whose first keyframe is after t=0 starts from the value passed to
+    sample()/compile() as start (its current target), else from that keyframe.
+    """
+
+    def __init__(self, keyframes: Dict[str, Sequence[Tuple[float, int]]], profile: str = "min_jerk"):
+        if profile not in PROFILES:
+            raise ValueError(f"unknown profile '{profile}' (expected one of {sorted(PROFILES)})")
+        self.profile = profile
+        self._ease = PROFILES[profile]
+        self.keyframes: Dict[str, List[Tuple[float, int]]] = {}
+        for joint, frames in keyframes.items():
+            frames = sorted((float(t), int(v)) for t, v in frames)
+            if not frames:
+                raise ValueError(f"joint '{joint}' has no keyframes")
+            if frames[0][0] < 0:
+                raise ValueError(f"joint '{joint}' has a keyframe before t=0")
+            self.keyframes[joint] = frames
+        self.duration = max((f[-1][0] for f in self.keyframes.values()), default=0.0)
+        self._times = {joint: [t for t, _ in f] for joint, f in self.keyframes.items()}
+
+    def joints(self) -> List[str]:
+        return list(self.keyframes)
+
+    def sample(self, t: float, start: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """
+        Setpoint of every joint at time t.
+        """
+        out: Dict[str, int] = {}
+        for joint, frames in self.keyframes.items():
+            times = self._times[joint]
+            i = bisect.bisect_right(times, t)
+            if i >= len(frames):
+                out[joint] = frames[-1][1]
+                continue
+            if i == 0:
+                t0, v0 = 0.0, (start or {}).get(joint, frames[0][1])
+            else:
+                t0, v0 = frames[i - 1]
+            t1, v1 = frames[i]
+            span = t1 - t0
+            u = 1.0 if span <= 0 else (t - t0) / span
+            out[joint] = int(round(v0 + (v1 - v0) * self._ease(u)))
+        return out
+
+    def compile(
+        self,
+        channels: Dict[str, int],
+        rate_hz: float = DEFAULT_RATE_HZ,
+        start: Optional[Dict[str, int]] = None,
+    ) -> List[Tuple[float, Dict[int, int]]]:
+        """
+        Fixed-rate frames [(t, {channel: target})], one per control tick up to
+        and including the end. Each frame only carries channels whose
+        setpoint changed since the previous tick; empty frames are dropped.
+        """
+        period = 1.0 / rate_hz
+        n_ticks = int(self.duration * rate_hz + 0.999999)
+        last: Dict[int, int] = {}
+        frames: List[Tuple[float, Dict[int, int]]] = []
+        for tick in range(n_ticks + 1):
+            t = min(tick * period, self.duration)
+            changed = {}
+            for joint, value in self.sample(t, start).items():
+                chan = channels[joint]
+                if last.get(chan) != value:
+                    changed[chan] = value
+                    last[chan] = value
+            if changed:
+                frames.append((t, changed))
+        return frames
+
+
+def run_timeline(
+    timeline: List[Tuple[float, Callable, tuple]],
+    cancel_event=None,
+    deadline: Optional[float] = None,
+    trace: Optional[list] = None,
+) -> bool:
+    """
+    Call fn(*args) for each (t, fn, args) at offset t on the monotonic clock.
+    Waits block on cancel_event, so a cancel takes effect immediately; the
+    last SPIN_S before each step is spun to start it on time. deadline is a
+    time.monotonic() value. If trace is a list, (scheduled, actual) offsets
+    of every step that ran are appended to it.
+    Returns False if cancelled or the deadline passed before the last entry.
+    """
+    t_start = time.monotonic()
+    for t, fn, args in timeline:
+        due = t_start + t
+        wait = due - time.monotonic() - SPIN_S
+        if wait > 0:
+            if cancel_event is not None:
+                if cancel_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+        while time.monotonic() < due:
+            pass
+        if cancel_event is not None and cancel_event.is_set():
+            return False
+        now = time.monotonic()
+        if deadline is not None and now > deadline:
+            return False
+        if trace is not None:
+            trace.append((t, now - t_start))
+        fn(*args)
+    return True
+
+
+def play(
+    maestro,
+    frames: List[Tuple[float, Dict[int, int]]],
+    cancel_event=None,
+    deadline: Optional[float] = None,
+    trace: Optional[list] = None,
+) -> bool:
+    """
+    Stream compiled frames with Controller.setTargets; see run_timeline.
+    """
+    timeline = [(t, maestro.setTargets, (targets,)) for t, targets in frames]
+    return run_timeline(timeline, cancel_event=cancel_event, deadline=deadline, trace=trace)
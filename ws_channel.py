@@ -0,0 +1,210 @@
+import base64
+import hashlib
+import socket
+import struct
+from typing import Optional
+
+from flask import Response
+
+# Minimal server side of a WebSocket (RFC 6455) for the control channel.
+#
+# flaskServer runs on Werkzeug's development server, which hands a request
+# handler the raw client socket as environ["werkzeug.socket"]. accept()
+# answers the upgrade handshake on that socket and returns a WebSocket with
+# blocking receive()/send() of text messages; pings are answered, fragmented
+# messages reassembled. No extensions (no compression) and no binary
+# messages, which the control channel never uses.
+#
+# The view that accepted a socket owns the connection from then on and must
+# return TakenOver() so the server doesn't write an HTTP response after it.
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_MESSAGE = 64 * 1024
+# How long close() waits for the client to finish the closing handshake.
+CLOSE_TIMEOUT_S = 1.0
+
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_UNSUPPORTED = 1003
+CLOSE_TOO_BIG = 1009
+
+
+class TakenOver(Response):
+    """
+    Response for a request whose socket became a WebSocket. Werkzeug's
+    server treats ConnectionError as a dropped client: it writes nothing and
+    logs nothing.
+    """
+
+    def __call__(self, environ, start_response):
+        raise ConnectionError("socket taken over by WebSocket")
+
+
+class WebSocket:
+    def __init__(self, sock):
+        self.sock = sock
+        self.closed = False
+
+    def receive(self) -> Optional[str]:
+        """
+        The next text message, or None once the connection is closed.
+        """
+        parts = []
+        size = 0
+        while not self.closed:
+            frame = self._read_frame()
+            if frame is None:
+                self.closed = True
+                return None
+            fin, opcode, payload = frame
+            if opcode == OP_PING:
+                self._send_frame(OP_PONG, payload)
+            elif opcode == OP_PONG:
+                pass
+            elif opcode == OP_CLOSE:
+                self.close(struct.unpack("!H", payload[:2])[0] if len(payload) >= 2 else CLOSE_NORMAL)
+                return None
+            elif opcode == OP_BINARY:
+                self.close(CLOSE_UNSUPPORTED)
+                return None
+            elif (opcode == OP_TEXT and not parts) or (opcode == OP_CONT and parts):
+                size += len(payload)
+                if size > MAX_MESSAGE:
+                    self.close(CLOSE_TOO_BIG)
+                    return None
+                parts.append(payload)
+                if fin:
+                    try:
+                        return b"".join(parts).decode("utf-8")
+                    except UnicodeDecodeError:
+                        self.close(CLOSE_PROTOCOL_ERROR)
+                        return None
+            else:
+                # A continuation with nothing to continue, a new message
+                # before the last one finished, or a reserved opcode.
+                self.close(CLOSE_PROTOCOL_ERROR)
+                return None
+        return None
+
+    def send(self, text: str) -> None:
+        self._send_frame(OP_TEXT, text.encode("utf-8"))
+
+    def close(self, code: int = CLOSE_NORMAL) -> None:
+        """
+        Send a close frame (best effort) and shut the socket. Safe to call
+        more than once.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._send_frame(OP_CLOSE, struct.pack("!H", code))
+            # The server's request handler still holds this socket and reads
+            # on once the view returns: discard whatever the client sends
+            # until it closes its end, so nothing is taken for a new request.
+            self.sock.settimeout(CLOSE_TIMEOUT_S)
+            while self.sock.recv(4096):
+                pass
+        except OSError:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+            self.sock.close()
+        except OSError:
+            pass
+
+    def _send_frame(self, opcode: int, payload: bytes) -> None:
+        n = len(payload)
+        if n < 126:
+            header = struct.pack("!BB", 0x80 | opcode, n)
+        elif n < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+        self.sock.sendall(header + payload)
+
+    def _read_frame(self):
+        """
+        (fin, opcode, unmasked payload), or None on EOF or a malformed frame.
+        """
+        head = self._recv_exact(2)
+        if head is None:
+            return None
+        fin = bool(head[0] & 0x80)
+        opcode = head[0] & 0x0F
+        masked = head[1] & 0x80
+        n = head[1] & 0x7F
+        if head[0] & 0x70 or not masked:
+            # Reserved bits need an extension; client frames must be masked.
+            self.close(CLOSE_PROTOCOL_ERROR)
+            return None
+        if opcode >= 0x8 and (not fin or n > 125):
+            self.close(CLOSE_PROTOCOL_ERROR)
+            return None
+        if n == 126:
+            ext = self._recv_exact(2)
+            n = struct.unpack("!H", ext)[0] if ext else None
+        elif n == 127:
+            ext = self._recv_exact(8)
+            n = struct.unpack("!Q", ext)[0] if ext else None
+        if n is None:
+            return None
+        if n > MAX_MESSAGE:
+            self.close(CLOSE_TOO_BIG)
+            return None
+        key = self._recv_exact(4)
+        payload = self._recv_exact(n)
+        if key is None or payload is None:
+            return None
+        return fin, opcode, _unmask(payload, key)
+
+    def _recv_exact(self, n: int) -> Optional[bytes]:
+        buf = bytearray()
+        while len(buf) < n:
+            try:
+                chunk = self.sock.recv(n - len(buf))
+            except OSError:
+                return None
+            if not chunk:
+                return None
+            buf += chunk
+        return bytes(buf)
+
+
+def _unmask(payload: bytes, key: bytes) -> bytes:
+    n = len(payload)
+    if not n:
+        return payload
+    mask = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(mask, "big")).to_bytes(n, "big")
+
+
+def accept(environ) -> Optional[WebSocket]:
+    """
+    Complete the upgrade handshake for a WebSocket request and return the
+    socket, or None if this is not a WebSocket request or the server doesn't
+    expose its raw socket.
+    """
+    sock = environ.get("werkzeug.socket")
+    key = environ.get("HTTP_SEC_WEBSOCKET_KEY")
+    connection = {t.strip().lower() for t in environ.get("HTTP_CONNECTION", "").split(",")}
+    if (
+        sock is None
+        or not key
+        or environ.get("HTTP_UPGRADE", "").lower() != "websocket"
+        or "upgrade" not in connection
+        or environ.get("HTTP_SEC_WEBSOCKET_VERSION") != "13"
+    ):
+        return None
+    digest = base64.b64encode(hashlib.sha1((key + GUID).encode("ascii")).digest()).decode("ascii")
+    sock.sendall(
+        (
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {digest}\r\n\r\n"
+        ).encode("ascii")
+    )
+    return WebSocket(sock)